@@ -1,35 +1,311 @@
 """
-This runs a big dataset of sudokus trough solver and checks if them are
-all successfully solved.
+This runs a big dataset of sudokus trough solvers, checks that they are
+all successfully solved and measures how fast.
 
-For more explicit results run:
+For every solver configuration and board size it reports wall time per
+puzzle (total, mean, p50, p95, max), search nodes, guesses and
+propagation passes. Results could be saved as JSON and compared with
+a saved baseline: the run fails if total time or nodes of any group grow
+more than the threshold.
 
-py.test -v benchmark.py
+Standalone run:
+
+python benchmark.py --output results.json
+python benchmark.py --baseline results.json --threshold 0.25
+python benchmark.py --startup
+
+As a part of test suite (coverage tracing slows solvers down several
+times, so turn it off when comparing with a baseline):
+
+py.test --runbenchmark -v benchmark.py
+py.test --runbenchmark --no-cov --benchmark-baseline=results.json benchmark.py
 """
 
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
 import pytest
-from sudoku.board import Board
+from sudoku.parsers import LineParser
 from sudoku.rules import RuleHandler
-from sudoku.solvers import BacktrackingSolver
+from sudoku.generator import generate_many
+from sudoku.solvers import get_solver, is_unique
+from sudoku.techniques import TECHNIQUES
+
+
+PROBLEMS = 'data/problems.txt'
+
+# Solver configurations by name, as `get_solver` arguments.
+CONFIGS = {
+    'backtracking': dict(engine='backtracking', select='degree',
+                         techniques=list(TECHNIQUES)),
+    'dlx': dict(engine='dlx'),
+}
+
+# Counters read from a solver after every solve, if it has them.
+COUNTERS = ['nodes', 'guesses', 'passes']
+
+# Rules solutions are verified with, outside of the measured time.
+RULES = RuleHandler()
+
+# Single 9x9 puzzle solved from the command line by `measure_startup`.
+STARTUP_PUZZLE = 'data/input.txt'
+
+# Seconds `python -m sudoku` may take to the first solution on top of the
+# interpreter startup, that depends on the installation only.
+STARTUP_TARGET = 0.040
+
+
+def load_puzzles(path):
+    """
+    Loads puzzles given one per line.
+    """
+    return list(LineParser().iter_file(path))
+
+
+def percentile(values, q):
+    """
+    Returns `q`-th percentile of `values` by the nearest rank.
+    """
+    values = sorted(values)
+    rank = int(math.ceil(q / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def run(puzzles, config):
+    """
+    Solves every puzzle with solver of `config` name. Returns list of
+    per-puzzle records.
+    """
+    solver = get_solver(**CONFIGS[config])
+    records = []
+    for number, puzzle in enumerate(puzzles):
+        started = time.perf_counter()
+        solution = next(solver.solve(puzzle), None)
+        record = {
+            'config': config,
+            'puzzle': number,
+            'size': puzzle.size,
+            'time': time.perf_counter() - started,
+            'solved': (solution is not None and
+                       RULES.validate(solution, complete=True) is None),
+        }
+        for counter in COUNTERS:
+            record[counter] = getattr(solver, counter, None)
+        records.append(record)
+    return records
+
+
+def summarize(records):
+    """
+    Returns aggregates of `records` grouped by "config/size" key.
+    """
+    groups = {}
+    for record in records:
+        key = '{}/{}x{}'.format(record['config'], record['size'],
+                                record['size'])
+        groups.setdefault(key, []).append(record)
+
+    summary = {}
+    for key, group in sorted(groups.items()):
+        times = [record['time'] for record in group]
+        summary[key] = {
+            'puzzles': len(group),
+            'solved': sum(1 for record in group if record['solved']),
+            'total': sum(times),
+            'mean': sum(times) / len(times),
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+            'max': max(times),
+        }
+        for counter in COUNTERS:
+            values = [record[counter] for record in group]
+            if None not in values:
+                summary[key][counter] = sum(values)
+    return summary
+
+
+def compare(summary, baseline, threshold):
+    """
+    Returns list of regressions of `summary` against `baseline` summary:
+    groups whose total time or nodes grew more than `threshold` share.
+    """
+    regressions = []
+    for key, group in sorted(summary.items()):
+        if key not in baseline:
+            continue
+        for metric in ['total', 'nodes']:
+            old = baseline[key].get(metric)
+            new = group.get(metric)
+            if old and new is not None and new > old * (1 + threshold):
+                regressions.append(
+                    '{} {}: {:.4g} -> {:.4g} (+{:.0%})'.format(
+                        key, metric, old, new, new / old - 1))
+    return regressions
+
+
+def format_summary(summary):
+    """
+    Formats summary as a text table.
+    """
+    header = '{:<22} {:>7} {:>8} {:>8} {:>8} {:>8} {:>9} {:>9} {:>7}'
+    row = ('{:<22} {:>7} {:>8.3f} {:>8.4f} {:>8.4f} {:>8.4f} {:>9} {:>9}'
+           ' {:>7}')
+    lines = [header.format('group', 'solved', 'total', 'p50', 'p95', 'max',
+                           'nodes', 'guesses', 'passes')]
+    for key, group in sorted(summary.items()):
+        lines.append(row.format(
+            key, '{}/{}'.format(group['solved'], group['puzzles']),
+            group['total'], group['p50'], group['p95'], group['max'],
+            *[group.get(counter, '-') for counter in COUNTERS]))
+    return '\n'.join(lines)
+
 
+def measure_startup(runs=20):
+    """
+    Solves `STARTUP_PUZZLE` with `python -m sudoku` in a new process
+    `runs` times. Returns median wall times of the `interpreter` start
+    alone, of the `solve` command and the `overhead` between them.
+    """
+    def median_time(command):
+        times = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.check_call(command, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - started)
+        return percentile(times, 50)
 
-matrixes = []
-with open('data/problems.txt') as f:
-    for line in f:
-        matrix = [int(i) for i in line.replace('.', '0').strip()]
-        matrixes.append(matrix)
+    with tempfile.TemporaryDirectory() as directory:
+        outfile = os.path.join(directory, 'solution.txt')
+        interpreter = median_time([sys.executable, '-c', 'pass'])
+        solve = median_time([sys.executable, '-m', 'sudoku', STARTUP_PUZZLE,
+                             outfile])
+    return {
+        'interpreter': interpreter,
+        'solve': solve,
+        'overhead': solve - interpreter,
+    }
 
 
-@pytest.fixture(params=matrixes)
+def format_startup(startup):
+    return ('Startup to the first solution: {:.1f}ms, interpreter {:.1f}ms,'
+            ' overhead {:.1f}ms (target {:.0f}ms).').format(
+        startup['solve'] * 1000, startup['interpreter'] * 1000,
+        startup['overhead'] * 1000, STARTUP_TARGET * 1000)
+
+
+def benchmark(puzzles, configs=None):
+    """
+    Runs every configuration of `configs` names over `puzzles`. Returns
+    `{'summary': ..., 'records': ...}` dict.
+    """
+    records = []
+    for config in configs or sorted(CONFIGS):
+        records.extend(run(puzzles, config))
+    return {'summary': summarize(records), 'records': records}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sudoku solvers benchmark')
+    parser.add_argument('puzzles', nargs='*', default=[PROBLEMS],
+                        help='Files with one puzzle per line')
+    parser.add_argument('--config', action='append',
+                        choices=sorted(CONFIGS),
+                        help='Solver configuration, every one by default')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Compare with saved results')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed growth of time or nodes, 0.25 is 25%%')
+    parser.add_argument('--startup', action='store_true',
+                        help='Measure command line startup only')
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        startup = measure_startup()
+        print(format_startup(startup))
+        return 1 if startup['overhead'] > STARTUP_TARGET else 0
+
+    puzzles = []
+    for path in args.puzzles:
+        puzzles.extend(load_puzzles(path))
+    results = benchmark(puzzles, args.config)
+    print(format_summary(results['summary']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    failed = [
+        record for record in results['records'] if not record['solved']
+    ]
+    for record in failed:
+        print('Not solved: {config} puzzle {puzzle}'.format(**record))
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['summary']
+        regressions = compare(results['summary'], baseline, args.threshold)
+        for regression in regressions:
+            print('Regression: {}'.format(regression))
+    return 1 if failed or regressions else 0
+
+
+boards = load_puzzles(PROBLEMS)
+
+
+@pytest.fixture(params=boards)
 def board(request):
-    return Board(request.param)
+    return request.param
+
 
-@pytest.fixture
-def solver():
-    return BacktrackingSolver(RuleHandler())
+@pytest.fixture(params=sorted(CONFIGS))
+def solver(request):
+    return get_solver(**CONFIGS[request.param])
 
 
 @pytest.mark.benchmark
 def test_solver(board, solver):
     solution = next(solver.solve(board))
-    assert all(not cell.is_empty for cell in solution)
+    assert RULES.validate(solution, complete=True) is None
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('size,count', [(4, 100), (9, 20)])
+def test_generator(size, count):
+    started = time.perf_counter()
+    puzzles = list(generate_many(count, size, seed=0))
+    elapsed = time.perf_counter() - started
+    print('Generated {} puzzles of {}x{} at {:.3g} puzzles/sec'.format(
+        count, size, size, count / elapsed))
+    assert all(is_unique(generated.puzzle) for generated in puzzles)
+
+
+@pytest.mark.benchmark
+def test_startup():
+    startup = measure_startup()
+    print(format_startup(startup))
+    assert startup['overhead'] < STARTUP_TARGET
+
+
+@pytest.mark.benchmark
+def test_regressions(request):
+    results = benchmark(boards)
+    print(format_summary(results['summary']))
+    output = request.config.getoption('--benchmark-output')
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    assert all(record['solved'] for record in results['records'])
+    baseline = request.config.getoption('--benchmark-baseline')
+    if baseline:
+        with open(baseline) as f:
+            baseline = json.load(f)['summary']
+        threshold = request.config.getoption('--benchmark-threshold')
+        assert [] == compare(results['summary'], baseline, threshold)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,12 @@ import pytest
 def pytest_addoption(parser):
     parser.addoption("--runbenchmark", action="store_true",
         help="run runbenchmarking tests")
+    parser.addoption("--benchmark-output",
+        help="write benchmark results as JSON")
+    parser.addoption("--benchmark-baseline",
+        help="fail if benchmark regresses against saved results")
+    parser.addoption("--benchmark-threshold", type=float, default=0.25,
+        help="allowed growth of benchmark time or nodes")
 
 
 def pytest_runtest_setup(item):
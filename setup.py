@@ -5,5 +5,8 @@ setup(
     author_email='wronglink@gmail.com',
     name='sudoku',
     description='Extendable sudoku solver',
-    packages=find_packages()
+    packages=find_packages(),
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
\ No newline at end of file
@@ -1,56 +1,230 @@
-import argparse
+"""
+Console Sudoku solver.
+
+    python -m sudoku data/input.txt data/output.json --display
+    python -m sudoku data/problems.txt solutions.txt --batch
+    python -m sudoku warm --engine dlx < data/problems.txt
+    python -m sudoku profile data/problems.txt
+
+Most runs solve a single puzzle, so startup is a large share of their
+time: modules are imported by the code paths that need them and the
+argument parser is built on the call of `main`.
+"""
 import os.path
-from sudoku.rules import RuleHandler
-from sudoku.solvers import BacktrackingSolver
-from sudoku.parsers import PARSER_FILE_EXT_MAPPING, ParseError, TextParser
+import sys
 
-parser = argparse.ArgumentParser(description='Console Sudoku solver')
 
-parser.add_argument('infile', help='Input file',
-                    type=argparse.FileType('r'))
-parser.add_argument('outfile', help='Output file',
-                    type=argparse.FileType('w'))
-parser.add_argument('--display', action='store_true',
-                    help='Display board before and after solution')
+# Options that make sense for the batch mode only.
+BATCH_OPTIONS = ['format', 'workers', 'unordered']
 
+# Formats of batch results, see `sudoku.batch.BATCH_FORMATS`.
+BATCH_FORMAT_NAMES = ['jsonl', 'line']
+
+
+def get_parser():
+    import argparse
+    from sudoku.solvers import ENGINES
+    from sudoku.strategies import ORDERS, SELECTORS
+    from sudoku.techniques import technique_names
+
+    parser = argparse.ArgumentParser(
+        prog='python -m sudoku',
+        description='Console Sudoku solver',
+        epilog='Run "python -m sudoku warm" to solve puzzles from stdin'
+               ' lines in a single process, "python -m sudoku profile'
+               ' --help" for the profiler.')
+    parser.add_argument('infile', help='Input file',
+                        type=argparse.FileType('r'))
+    parser.add_argument('outfile', help='Output file',
+                        type=argparse.FileType('w'))
+    parser.add_argument('--display', action='store_true',
+                        help='Display board before and after solution')
+    parser.add_argument('--engine', choices=ENGINES,
+                        default='backtracking', help='Solver engine')
+    parser.add_argument('--strategy', choices=sorted(SELECTORS),
+                        default='first',
+                        help='Cell selection strategy of the backtracking'
+                             ' engine')
+    parser.add_argument('--order', choices=sorted(ORDERS),
+                        default='ascending',
+                        help='Candidates order of the backtracking engine')
+    parser.add_argument('--techniques', type=technique_names, default=[],
+                        help='Comma separated propagation techniques of the'
+                             ' backtracking engine, or "all"')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print search statistics of the backtracking'
+                             ' engine to stderr')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='Solution cache file, loaded if exists and'
+                             ' saved after solving')
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='Number of puzzles kept in the solution cache')
+    parser.add_argument('--batch', action='store_true',
+                        help='Solve every line of infile as a separate'
+                             ' puzzle')
+    parser.add_argument('--format', choices=BATCH_FORMAT_NAMES,
+                        default='line', help='Output format of the batch'
+                                             ' mode')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes solving batch puzzles')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Write batch solutions in completion order')
+    parser.add_argument('--timeout', type=float,
+                        help='Seconds to give every puzzle')
+    parser.add_argument('--max-nodes', type=int,
+                        help='Search nodes to give every puzzle')
+    return parser
+
+
+def get_budget(args):
+    if args.timeout is None and args.max_nodes is None:
+        return None
+    from sudoku.solvers import Budget
+    return Budget(args.timeout, args.max_nodes)
+
+
+def run_batch(args, solver, flush=False):
+    """
+    Solves every line of the input file. With `flush` every result is
+    written out at once, so a client could wait for it.
+    """
+    from sudoku.batch import BATCH_FORMATS, BatchStats, solve_batch
+
+    stats = BatchStats()
+    formatter = BATCH_FORMATS[args.format]
+    budget = get_budget(args)
+    if args.workers > 1:
+        from sudoku.parallel import solve_parallel
+        results = solve_parallel(args.infile, args.workers, args.engine,
+                                 args.strategy, args.order, args.techniques,
+                                 ordered=not args.unordered, stats=stats,
+                                 budget=budget)
+    else:
+        results = solve_batch(args.infile, solver, stats, budget=budget)
+    for result in results:
+        args.outfile.write(formatter(*result))
+        args.outfile.write('\n')
+        if flush:
+            args.outfile.flush()
+    print(stats.summary(), file=sys.stderr)
 
-if __name__ == '__main__':
-    args = parser.parse_args()
 
-    _, infile_ext = os.path.splitext(args.infile.name)
-    if infile_ext not in PARSER_FILE_EXT_MAPPING:
-        print('Unknown file extension: {}'.format(args.infile.name))
-    _, outfile_ext = os.path.splitext(args.outfile.name)
-    if outfile_ext not in PARSER_FILE_EXT_MAPPING:
-        print('Unknown file extension: {}'.format(args.outfile.name))
+def get_file_parser(parser, file):
+    """
+    Returns board parser of the `file` extension, reopens binary files in
+    binary mode (the argument parser opens them in text mode).
+    """
+    from sudoku.parsers import PARSER_FILE_EXT_MAPPING
 
-    infile_parser = PARSER_FILE_EXT_MAPPING[infile_ext]()
-    outfile_parser = PARSER_FILE_EXT_MAPPING[outfile_ext]()
-    text_parser = TextParser()
+    _, ext = os.path.splitext(file.name)
+    if ext not in PARSER_FILE_EXT_MAPPING:
+        parser.error('unknown file extension of {}, choose from {}'.format(
+            file.name, ', '.join(sorted(PARSER_FILE_EXT_MAPPING))))
+    file_parser = PARSER_FILE_EXT_MAPPING[ext]()
+    if file_parser.binary:
+        mode = 'rb' if 'r' in file.mode else 'wb'
+        file.close()
+        file = open(file.name, mode)
+    return file_parser, file
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['profile']:
+        from sudoku.profiling import main as profile
+        return profile(argv[1:])
+    warm = argv[:1] == ['warm']
+    if warm:
+        # Warm mode is the batch mode over stdin and stdout, that answers
+        # every puzzle as soon as it is solved.
+        argv = ['-', '-', '--batch'] + argv[1:]
+
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if not args.batch:
+        for option in BATCH_OPTIONS:
+            if getattr(args, option) != parser.get_default(option):
+                parser.error('--{} requires --batch'.format(option))
+    if warm and args.workers > 1:
+        parser.error('--workers is not supported by the warm mode')
+    if args.stats and (args.batch or args.engine != 'backtracking'):
+        parser.error('--stats supports a single puzzle and the backtracking'
+                     ' engine only')
+    if args.cache and args.workers > 1:
+        parser.error('--cache is not supported with --workers')
+    if not args.batch:
+        infile_parser, args.infile = get_file_parser(parser, args.infile)
+        outfile_parser, args.outfile = get_file_parser(parser, args.outfile)
+
+    from sudoku.solvers import BudgetExceeded, get_solver
+
+    tracer = None
+    if args.stats:
+        from sudoku.tracing import StatsTracer
+        tracer = StatsTracer()
+    solver = get_solver(args.engine, args.strategy, args.order,
+                        args.techniques, tracer)
+    cache = None
+    cached_solver = solver
+    if args.cache:
+        from sudoku.cache import CachedSolver, SolutionCache
+        cache = SolutionCache(args.cache_size)
+        if os.path.exists(args.cache):
+            cache.load(args.cache)
+        cached_solver = CachedSolver(solver, cache)
+
+    if args.batch:
+        run_batch(args, cached_solver, flush=warm)
+        if cache is not None:
+            cache.save(args.cache)
+            print('Cache: {} hits, {} misses.'.format(cache.hits,
+                                                      cache.misses),
+                  file=sys.stderr)
+        return 0
+
+    from sudoku.parsers import ParseError, TextParser
 
     try:
         puzzle = infile_parser.loads(args.infile.read())
     except ParseError as e:
         print(e)
-        exit(1)
-
-    rules = RuleHandler()
-    solver = BacktrackingSolver(rules)
+        return 1
 
     if args.display:
         print('Puzzle:')
-        print(text_parser.dumps(puzzle))
+        print(TextParser().dumps(puzzle))
 
     try:
-        solution = next(solver.solve(puzzle))
-    except StopIteration:
+        solution = next(cached_solver.solve(puzzle, budget=get_budget(args)),
+                        None)
+    except BudgetExceeded as e:
+        print('{} Search stopped after {} nodes, {} guesses, {:.2f}s.'.format(
+            e, e.nodes, e.guesses, e.elapsed))
+        if args.stats:
+            print(tracer.stats.summary(), file=sys.stderr)
+        return 3
+    if cache is not None:
+        cache.save(args.cache)
+    if solution is None:
         print('No solution could be found.')
-        exit(2)
+        return 2
 
     if args.display:
         print('Solution:')
-        print(text_parser.dumps(solution))
+        print(TextParser().dumps(solution))
+        print('Search nodes: {}'.format(solver.nodes), file=sys.stderr)
+        for name, count in sorted(getattr(solver, 'eliminations', {}).items()):
+            print('Eliminated by {}: {}'.format(name, count),
+                  file=sys.stderr)
     else:
         print('Puzzle solved.')
 
+    if args.stats:
+        print(tracer.stats.summary(), file=sys.stderr)
+
     args.outfile.write(outfile_parser.dumps(solution))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
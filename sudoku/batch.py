@@ -0,0 +1,126 @@
+import json
+import time
+from sudoku.parsers import ParseError, LineParser
+from sudoku.rules import RuleHandler
+from sudoku.solvers import BudgetExceeded
+
+
+class BatchStats(object):
+    """
+    Counters of a batch run.
+    """
+    def __init__(self):
+        self.solved = 0
+        self.failed = 0
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def total(self):
+        return self.solved + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.total / elapsed if elapsed else 0.0
+
+    def summary(self):
+        return ('Solved {} of {} puzzles in {:.2f}s ({:.1f} puzzles/sec),'
+                ' {} failed.').format(self.solved, self.total, self.elapsed,
+                                      self.rate, self.failed)
+
+
+def solve_batch(lines, solver, stats=None, timeout=None, budget=None):
+    """
+    Solves puzzles given one per line, like `data/problems.txt`.
+
+    Lines are consumed lazily and puzzles are solved one at a time, so
+    memory doesn't depend on the input size. Yields `(puzzle, solution,
+    error)` for every non-blank line, where `puzzle` is the stripped line,
+    `solution` is the first solution board or None and `error` describes
+    why the puzzle wasn't solved. A puzzle solved longer than `timeout`
+    seconds or running out of `budget` (see `sudoku.solvers.Budget`) is
+    reported as failed.
+    """
+    parser = LineParser()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            puzzle = parser.loads(line)
+        except ParseError as e:
+            solution, error = None, str(e)
+        else:
+            try:
+                solution = next(solver.solve(puzzle, timeout, budget), None)
+            except BudgetExceeded as e:
+                solution, error = None, str(e)
+            else:
+                error = None if solution else 'No solution could be found.'
+        if stats is not None:
+            if solution is None:
+                stats.failed += 1
+            else:
+                stats.solved += 1
+        yield line, solution, error
+    if stats is not None:
+        stats.finished = time.time()
+
+
+def verify_batch(lines, rules=None):
+    """
+    Verifies solutions given one per line, like the output of
+    `solve_batch`. Yields `(line, error)` for every non-blank line, where
+    `error` describes the first conflict (see `RuleHandler.validate`) or
+    is None for a solved grid.
+    """
+    rules = rules or RuleHandler()
+    parser = LineParser()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            conflict = rules.validate(parser.loads(line), complete=True)
+        except ParseError as e:
+            error = str(e)
+        else:
+            error = str(conflict) if conflict is not None else None
+        yield line, error
+
+
+def dumps_line(board):
+    """
+    Dumps board into a single line of digits.
+    """
+    return ''.join(map(str, board.values))
+
+
+def format_line(puzzle, solution, error):
+    """
+    Formats batch result as a solution line, unsolved puzzles give an
+    empty line to keep output aligned with input.
+    """
+    return dumps_line(solution) if solution is not None else ''
+
+
+def format_json(puzzle, solution, error):
+    """
+    Formats batch result as a JSON object line.
+    """
+    return json.dumps({
+        'puzzle': puzzle,
+        'solution': dumps_line(solution) if solution is not None else None,
+        'error': error,
+    })
+
+
+BATCH_FORMATS = {
+    'line': format_line,
+    'jsonl': format_json,
+}
@@ -33,37 +33,183 @@ class Cell(object):
         return self.value == 0
 
 
+class BoardCell(Cell):
+    """
+    Cell view of a board position. Reads and writes its value straight
+    from the board storage, so changes are visible on the board.
+    """
+    __slots__ = ['values', 'index']
+
+    def __init__(self, values, index, x, y):
+        self.values = values
+        self.index = index
+        self.x = x
+        self.y = y
+
+    @property
+    def value(self):
+        return self.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.values[self.index] = value
+
+
+class Layout(object):
+    """
+    Precomputed index tables for board of `size`, shared by every board of
+    the same size (see `get_layout`), so hot code does plain tuple lookups:
+
+    1.  `rows`, `columns` and `squares` list cell indexes of every unit.
+    2.  `cell_rows`, `cell_columns` and `cell_squares` give the unit number
+        of every cell index.
+    3.  `peers` lists indexes of the cells sharing a row, column or square
+        with every cell (20 peers for 9x9 board).
+    """
+    kinds = ('rows', 'columns', 'squares')
+
+    def __init__(self, size):
+        self.size = size
+        self.square_size = square_size = int(round(size ** 0.5))
+        self.rows = tuple(
+            tuple(range(size * y, size * (y + 1))) for y in range(size)
+        )
+        self.columns = tuple(
+            tuple(range(x, size * size, size)) for x in range(size)
+        )
+        self.squares = tuple(
+            tuple(
+                size * (square_y + y) + square_x + x
+                for y in range(square_size)
+                for x in range(square_size)
+            )
+            for square_y in range(0, size, square_size)
+            for square_x in range(0, size, square_size)
+        )
+        self.cell_rows = tuple(i // size for i in range(size * size))
+        self.cell_columns = tuple(i % size for i in range(size * size))
+        self.cell_squares = tuple(
+            (i // size // square_size) * square_size
+            + i % size // square_size
+            for i in range(size * size)
+        )
+        self._unit_tables = {}
+        self.peers = self.get_unit_tables(self.kinds)[2]
+
+    def get_unit_tables(self, kinds):
+        """
+        Returns `(cell_units, unit_cells, peers)` tables for the units of
+        `kinds` ('rows', 'columns', 'squares'):
+
+        1.  `cell_units` lists unit ids of every cell index.
+        2.  `unit_cells` lists cell indexes of every unit id.
+        3.  `peers` lists indexes of cells sharing a unit with every cell.
+        """
+        kinds = tuple(kind for kind in self.kinds if kind in kinds)
+        if kinds in self._unit_tables:
+            return self._unit_tables[kinds]
+
+        unit_cells = []
+        numbers = []
+        for kind in kinds:
+            unit_cells.extend(getattr(self, kind))
+            numbers.append(getattr(self, 'cell_' + kind))
+        cell_units = tuple(
+            tuple(n * self.size + units[index]
+                  for n, units in enumerate(numbers))
+            for index in range(self.size * self.size)
+        )
+
+        peers = []
+        for index, units in enumerate(cell_units):
+            cell_peers = set()
+            for unit in units:
+                cell_peers.update(unit_cells[unit])
+            cell_peers.discard(index)
+            peers.append(tuple(sorted(cell_peers)))
+
+        tables = cell_units, tuple(unit_cells), tuple(peers)
+        self._unit_tables[kinds] = tables
+        return tables
+
+
+# Layouts already built, keyed by board size.
+_layouts = {}
+
+
+def get_layout(size):
+    """
+    Returns `Layout` for board of `size`, building it on the first call.
+    """
+    layout = _layouts.get(size)
+    if layout is None:
+        layout = _layouts[size] = Layout(size)
+    return layout
+
+
 class Board(object):
+    """
+    Sudoku board stored as a flat `bytearray` of cell values, one byte per
+    cell, 0 stands for an empty cell.
+
+    `Cell` objects are not stored: iteration, indexing and row, column or
+    square getters create `BoardCell` views on demand. Hot code should
+    work with `values` and cell indexes directly.
+    """
+    __slots__ = ['values', 'size', 'square_size', 'layout']
+
     def __init__(self, matrix):
-        size = int(len(matrix) ** 0.5)
-        self.matrix = [
-            Cell(matrix[x + y * size], x, y)
-            for y in range(size)
-            for x in range(size)
-        ]
+        self.values = bytearray(matrix)
+        self.size = int(round(len(self.values) ** 0.5))
+        self.layout = get_layout(self.size)
+        self.square_size = self.layout.square_size
 
     def __iter__(self):
-        return iter(self.matrix)
+        return map(self.get_view, range(len(self.values)))
+
+    def __len__(self):
+        return len(self.values)
 
     def __getitem__(self, key):
         if isinstance(key, slice):
             return self.get_cell(key.start, key.stop)
         else:
-            return self.matrix[key]
+            return self.get_view(range(len(self.values))[key])
 
-    @property
-    def size(self):
-        return int(len(self.matrix) ** 0.5)
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def copy(self):
+        """
+        Returns independent board with the same values.
+        """
+        return type(self)(self.values)
 
     @property
-    def square_size(self):
-        return int(len(self.matrix) ** 0.25)
+    def matrix(self):
+        """
+        Returns list of every board cell.
+        """
+        return list(self)
+
+    def get_view(self, index):
+        """
+        Returns cell view by its index in `values`.
+        """
+        y, x = divmod(index, self.size)
+        return BoardCell(self.values, index, x, y)
+
+    def get_views(self, indexes):
+        return [self.get_view(index) for index in indexes]
 
     def get_cell(self, x, y):
         """
         Returns cell by x, y board coordinates.
         """
-        return self.matrix[self.size * y + x]
+        return self.get_view(self.size * y + x)
 
     @property
     def rows(self):
@@ -76,7 +222,7 @@ class Board(object):
         """
         Returns n-th row
         """
-        return self.matrix[self.size * n:self.size * (n + 1)]
+        return self.get_views(self.layout.rows[n])
 
     @property
     def columns(self):
@@ -89,7 +235,7 @@ class Board(object):
         """
         Returns n-th column
         """
-        return self.matrix[n::self.size]
+        return self.get_views(self.layout.columns[n])
 
     @property
     def squares(self):
@@ -109,18 +255,13 @@ class Board(object):
         │ 0,1 │ 1,1 │
         └─────┴─────┘
         """
-        square = []
-        _x = self.square_size * x
-        _y = self.square_size * y
-        offset = self.size * _y + _x
-        for i in range(self.square_size):
-            square += self.matrix[offset:offset + self.square_size]
-            offset += self.size
-        return square
+        return self.get_views(
+            self.layout.squares[self.square_size * y + x])
 
     def get_square_by_cell(self, x, y):
         """
         Returns square containing cell with x, y coordinates.
         """
-        return self.get_square(x // self.square_size, y // self.square_size)
-
+        index = self.size * y + x
+        return self.get_views(
+            self.layout.squares[self.layout.cell_squares[index]])
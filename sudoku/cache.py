@@ -0,0 +1,267 @@
+import json
+from collections import OrderedDict
+from itertools import permutations, product
+from sudoku.board import Board
+
+
+class Transform(object):
+    """
+    Validity preserving transformation of a board: optional transposition,
+    then reordering of rows and columns and relabeling of digits.
+
+    Target row `i` is the source row `rows[i]` and target column `j` is
+    the source column `columns[j]`, digit `d` becomes `labels[d]`.
+    """
+    def __init__(self, size, transpose, rows, columns, labels):
+        self.size = size
+        self.transpose = transpose
+        self.rows = rows
+        self.columns = columns
+        self.labels = labels
+
+    def orient(self, values):
+        """
+        Returns `values` transposed if the transform transposes.
+        """
+        if not self.transpose:
+            return values
+        size = self.size
+        return bytes(
+            values[size * x + y] for y in range(size) for x in range(size))
+
+    def apply(self, values):
+        """
+        Returns transformed board `values`.
+        """
+        values = self.orient(values)
+        size = self.size
+        labels = self.labels
+        return bytes(
+            labels[values[size * row + column]]
+            for row in self.rows for column in self.columns
+        )
+
+    def invert(self, values):
+        """
+        Returns board values, that `apply` transforms into `values`.
+        """
+        size = self.size
+        digits = [0] * (size + 1)
+        for digit, label in enumerate(self.labels):
+            digits[label] = digit
+        result = bytearray(size * size)
+        index = 0
+        for row in self.rows:
+            for column in self.columns:
+                result[size * row + column] = digits[values[index]]
+                index += 1
+        return self.orient(bytes(result))
+
+
+def line_keys(values, size, square_size):
+    """
+    Returns invariant key of every row of board `values`: number of clues
+    and sorted numbers of clues in every stack. Keys don't change when
+    columns are reordered inside and between stacks or digits relabeled.
+    """
+    keys = []
+    for row in range(size):
+        counts = [0] * square_size
+        for column in range(size):
+            if values[size * row + column]:
+                counts[column // square_size] += 1
+        keys.append((sum(counts), tuple(sorted(counts))))
+    return keys
+
+
+def tie_orders(items, key):
+    """
+    Returns every order of `items` sorted by `key`, that differ by order
+    of items with equal keys.
+    """
+    items = sorted(items, key=key)
+    groups = []
+    for item in items:
+        if groups and key(groups[-1][0]) == key(item):
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    return [
+        [item for group in order for item in group]
+        for order in product(*(list(permutations(g)) for g in groups))
+    ]
+
+
+def line_orders(keys, square_size, limit):
+    """
+    Returns candidate orders of lines with invariant `keys`: bands are
+    sorted by their sorted line keys and lines by their keys inside the
+    band. Only the first order is returned if there are more than `limit`.
+    """
+    bands = [
+        list(range(square_size * band, square_size * (band + 1)))
+        for band in range(square_size)
+    ]
+    band_orders = tie_orders(
+        range(square_size),
+        lambda band: sorted(keys[line] for line in bands[band]))
+    inner_orders = [tie_orders(lines, keys.__getitem__) for lines in bands]
+    count = len(band_orders)
+    for orders in inner_orders:
+        count *= len(orders)
+    if count > limit:
+        band_orders = band_orders[:1]
+        inner_orders = [orders[:1] for orders in inner_orders]
+    return [
+        [line for lines in inner for line in lines]
+        for band_order in band_orders
+        for inner in product(*(inner_orders[band] for band in band_order))
+    ]
+
+
+def canonicalize(board, limit=64):
+    """
+    Returns `(key, transform)` of the `board`, where `key` is the bytes of
+    the least transformed board over transpositions, candidate row and
+    column orders (see `line_orders`) and digits relabeled in order of
+    their first appearance.
+
+    Boards, that differ by these transformations, share the key as long
+    as the row and column orders are not cut by `limit`. Otherwise the
+    key is still valid, but only matches fewer equivalent boards.
+    """
+    size = board.size
+    square_size = board.square_size
+    values = bytes(board.values)
+    best = None
+    for transpose in (False, True):
+        transform = Transform(size, transpose, None, None, None)
+        oriented = transform.orient(values)
+        row_orders = line_orders(
+            line_keys(oriented, size, square_size), square_size, limit)
+        columns_values = Transform(size, True, None, None, None).orient(
+            oriented)
+        column_orders = line_orders(
+            line_keys(columns_values, size, square_size), square_size,
+            limit)
+        if len(row_orders) * len(column_orders) > limit:
+            row_orders = row_orders[:1]
+            column_orders = column_orders[:1]
+        for rows, columns in product(row_orders, column_orders):
+            labels = [0] * (size + 1)
+            label = 0
+            key = bytearray()
+            for row in rows:
+                for column in columns:
+                    digit = oriented[size * row + column]
+                    if digit and not labels[digit]:
+                        label += 1
+                        labels[digit] = label
+                    key.append(labels[digit])
+            if best is None or key < best[0]:
+                for digit in range(1, size + 1):
+                    if not labels[digit]:
+                        label += 1
+                        labels[digit] = label
+                best = (bytes(key), Transform(size, transpose, rows,
+                                              columns, labels))
+    return best
+
+
+class SolutionCache(object):
+    """
+    Least recently used cache of first solutions keyed by canonical form
+    of puzzles (see `canonicalize`), so a puzzle that differs from a
+    cached one by transposition, row and column reordering inside and
+    between bands and stacks or digits relabeling is a hit too.
+
+    Puzzles without solutions are cached as None. `hits` and `misses`
+    count lookups. The cache could be saved to and loaded from a JSON
+    file.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, puzzle):
+        """
+        Returns `(found, solution)` pair for the `puzzle`. Solution is
+        a new board or None for cached puzzle without solutions.
+        """
+        key, transform = canonicalize(puzzle)
+        if key not in self.entries:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        solution = self.entries[key]
+        if solution is None:
+            return True, None
+        return True, Board(transform.invert(solution))
+
+    def store(self, puzzle, solution):
+        """
+        Caches `solution` of the `puzzle`, None if it has no solutions.
+        """
+        key, transform = canonicalize(puzzle)
+        if solution is not None:
+            solution = transform.apply(bytes(solution.values))
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def save(self, path):
+        """
+        Writes cache entries to the file at `path`.
+        """
+        entries = [
+            [key.hex(), solution.hex() if solution is not None else None]
+            for key, solution in self.entries.items()
+        ]
+        with open(path, 'w') as f:
+            json.dump({'entries': entries}, f)
+
+    def load(self, path):
+        """
+        Adds cache entries from the file at `path`, written by `save`.
+        """
+        with open(path) as f:
+            entries = json.load(f)['entries']
+        for key, solution in entries:
+            key = bytes.fromhex(key)
+            if solution is not None:
+                solution = bytes.fromhex(solution)
+            self.entries[key] = solution
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+class CachedSolver(object):
+    """
+    Solver wrapper, that looks up first solutions in `SolutionCache`
+    before solving the puzzle with `solver`.
+
+    Unlike other solvers `solve` yields the first solution only.
+    """
+    def __init__(self, solver, cache=None):
+        self.solver = solver
+        self.cache = cache if cache is not None else SolutionCache()
+
+    def solve(self, puzzle, timeout=None, budget=None):
+        """
+        Returns generator for the first puzzle solution.
+        """
+        found, solution = self.cache.lookup(puzzle)
+        if not found:
+            solution = next(self.solver.solve(puzzle, timeout, budget),
+                            None)
+            self.cache.store(puzzle, solution)
+        if solution is not None:
+            yield solution
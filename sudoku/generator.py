@@ -0,0 +1,224 @@
+"""
+Generator of puzzles with a unique solution and a difficulty grade.
+
+    python -m sudoku.generator 100 puzzles.txt --size 9 --seed 1 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sudoku.board import Board
+from sudoku.cache import Transform
+from sudoku.solvers import DLXSolver, get_solver, is_unique
+from sudoku.techniques import TECHNIQUES
+
+
+# Difficulty grades from the easiest one, see `grade`.
+GRADES = ['easy', 'medium', 'hard', 'expert']
+
+
+class GeneratedPuzzle(object):
+    """
+    Generated `puzzle` board with its `solution` and difficulty `grade`.
+    """
+    def __init__(self, puzzle, solution, grade):
+        self.puzzle = puzzle
+        self.solution = solution
+        self.grade = grade
+
+    @property
+    def clues(self):
+        return sum(1 for value in self.puzzle.values if value)
+
+
+def get_random(seed, index=0):
+    """
+    Returns random generator for the `index`-th puzzle of `seed`, so every
+    puzzle depends on the seed and its number only.
+    """
+    return random.Random('{}:{}'.format(seed, index))
+
+
+def random_lines(square_size, rng):
+    """
+    Returns random order of board lines, that keeps lines of a band
+    together.
+    """
+    bands = list(range(square_size))
+    rng.shuffle(bands)
+    lines = []
+    for band in bands:
+        band_lines = list(range(square_size * band,
+                                square_size * (band + 1)))
+        rng.shuffle(band_lines)
+        lines.extend(band_lines)
+    return lines
+
+
+def random_grid(size, rng):
+    """
+    Returns random solved board of `size`.
+
+    Squares on the main diagonal don't share units, so they are filled
+    with random permutations and the rest is completed by `DLXSolver`
+    (filled again if it can't be completed, that happens to 4x4 boards).
+    A random transposition, lines reordering and relabeling of digits
+    then hides the structure left by the solver.
+    """
+    board = Board([0] * (size * size))
+    layout = board.layout
+    grid = None
+    while grid is None:
+        for square in range(0, size, layout.square_size + 1):
+            digits = list(range(1, size + 1))
+            rng.shuffle(digits)
+            for index, digit in zip(layout.squares[square], digits):
+                board.values[index] = digit
+        grid = next(DLXSolver().solve(board), None)
+    labels = [0] + rng.sample(range(1, size + 1), size)
+    transform = Transform(size, rng.random() < 0.5,
+                          random_lines(layout.square_size, rng),
+                          random_lines(layout.square_size, rng), labels)
+    return Board(transform.apply(grid.values))
+
+
+def remove_clues(grid, rng, min_clues=0, symmetric=False):
+    """
+    Returns puzzle made of solved `grid` by removing clues in random order
+    while the puzzle keeps the only solution, until `min_clues` are left.
+    With `symmetric` clues are removed in pairs symmetric about the
+    board center.
+
+    Uniqueness is checked by the backtracking engine with every
+    technique: on sparse 16x16 boards it is an order of magnitude faster
+    than DLX.
+    """
+    puzzle = grid.copy()
+    values = puzzle.values
+    last = len(values) - 1
+    indexes = list(range(len(values)))
+    rng.shuffle(indexes)
+    solver = get_solver('backtracking', 'degree', techniques=TECHNIQUES)
+    clues = len(values)
+    for index in indexes:
+        cells = {index, last - index} if symmetric else {index}
+        if not values[index] or clues - len(cells) < min_clues:
+            continue
+        removed = [(cell, values[cell]) for cell in cells]
+        for cell in cells:
+            values[cell] = 0
+        if is_unique(puzzle, solver):
+            clues -= len(cells)
+        else:
+            for cell, value in removed:
+                values[cell] = value
+    return puzzle
+
+
+def grade(puzzle):
+    """
+    Returns difficulty grade of the `puzzle` by the techniques its solve
+    needs:
+
+    1.  `easy` is solved with naked singles only.
+    2.  `medium` needs hidden singles.
+    3.  `hard` needs other techniques of `sudoku.techniques`.
+    4.  `expert` can't be solved without guessing.
+    """
+    solver = get_solver('backtracking', 'degree', techniques=TECHNIQUES)
+    next(solver.solve(puzzle))
+    if solver.guesses:
+        return 'expert'
+    used = set(solver.eliminations)
+    if used - {'hidden_singles'}:
+        return 'hard'
+    if used:
+        return 'medium'
+    return 'easy'
+
+
+def generate(size=9, rng=None, min_clues=0, symmetric=False):
+    """
+    Returns `GeneratedPuzzle` of `size` with the only solution.
+    """
+    rng = rng if rng is not None else random.Random()
+    solution = random_grid(size, rng)
+    puzzle = remove_clues(solution, rng, min_clues, symmetric)
+    return GeneratedPuzzle(puzzle, solution, grade(puzzle))
+
+
+def generate_one(args):
+    seed, index, size, min_clues, symmetric = args
+    return generate(size, get_random(seed, index), min_clues, symmetric)
+
+
+def generate_many(count, size=9, seed=None, workers=1, min_clues=0,
+                  symmetric=False):
+    """
+    Yields `count` generated puzzles. The `index`-th puzzle depends on the
+    `seed` and its number only, so the output is the same for any number
+    of `workers` processes.
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    tasks = (
+        (seed, index, size, min_clues, symmetric) for index in range(count)
+    )
+    if workers == 1:
+        for task in tasks:
+            yield generate_one(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for generated in pool.map(generate_one, tasks, chunksize=4):
+            yield generated
+
+
+def format_puzzle(board):
+    """
+    Formats board as a line: digits and dots for boards up to 9x9, that
+    `TextParser` reads, or JSON array of rows, that `JSONParser` reads.
+    """
+    if board.size < 10:
+        return ''.join(str(value) if value else '.' for value in board.values)
+    return json.dumps([list(board.values[row[0]:row[-1] + 1])
+                       for row in board.layout.rows])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sudoku puzzles generator')
+    parser.add_argument('count', type=int, help='Number of puzzles')
+    parser.add_argument('outfile', type=argparse.FileType('w'),
+                        help='Output file, one puzzle per line')
+    parser.add_argument('--size', type=int, default=9, help='Board size')
+    parser.add_argument('--seed', help='Seed to reproduce the output')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes, 0 for every CPU')
+    parser.add_argument('--min-clues', type=int, default=0,
+                        help='Stop removing clues at this number')
+    parser.add_argument('--symmetric', action='store_true',
+                        help='Remove clues in symmetric pairs')
+    parser.add_argument('--grade', choices=GRADES,
+                        help='Write puzzles of this grade only')
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    grades = dict.fromkeys(GRADES, 0)
+    for generated in generate_many(args.count, args.size, args.seed,
+                                   args.workers, args.min_clues,
+                                   args.symmetric):
+        grades[generated.grade] += 1
+        if args.grade in (None, generated.grade):
+            args.outfile.write(format_puzzle(generated.puzzle))
+            args.outfile.write('\n')
+    elapsed = time.time() - started
+    print('Generated {} puzzles in {:.2f}s ({:.3g} puzzles/sec): {}.'.format(
+        args.count, elapsed, args.count / elapsed if elapsed else 0.0,
+        ', '.join('{} {}'.format(count, name)
+                  for name, count in grades.items())), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
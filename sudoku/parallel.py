@@ -0,0 +1,183 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                wait)
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from sudoku.batch import dumps_line
+from sudoku.board import Board
+from sudoku.parsers import ParseError, LineParser
+from sudoku.solvers import BudgetExceeded, get_solver
+
+
+# Per-process worker state, set up by `init_worker`.
+_worker = {}
+
+
+def init_worker(engine, select, order, techniques, timeout, budget):
+    _worker['solver'] = get_solver(engine, select, order, techniques)
+    _worker['parser'] = LineParser()
+    _worker['timeout'] = timeout
+    _worker['budget'] = budget
+
+
+def solve_line(line):
+    """
+    Solves puzzle line inside a worker. Returns `(solution, error)` pair,
+    where solution is a line of digits or None.
+    """
+    try:
+        puzzle = _worker['parser'].loads(line)
+        solution = next(_worker['solver'].solve(
+            puzzle, _worker['timeout'], _worker['budget']), None)
+    except (ParseError, BudgetExceeded) as e:
+        return None, str(e)
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+    if solution is None:
+        return None, 'No solution could be found.'
+    return dumps_line(solution), None
+
+
+def solve_chunk(chunk):
+    return [solve_line(line) for line in chunk]
+
+
+def iter_chunks(lines, chunksize):
+    """
+    Splits stripped non-blank `lines` into lists of `chunksize` length.
+    """
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line)
+    while True:
+        chunk = list(islice(lines, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+class WorkerPool(object):
+    """
+    Process pool, that is started again when a worker process dies.
+
+    Dead worker breaks the whole `ProcessPoolExecutor`: every chunk in
+    flight fails with `BrokenProcessPool`. The pool then starts a new
+    executor, submits again chunks that didn't finish and solves the
+    chunk that failed puzzle by puzzle, so only the puzzle that killed
+    its worker is reported as failed.
+    """
+    crash_error = 'Worker process died.'
+
+    def __init__(self, workers, initargs):
+        self.workers = workers
+        self.initargs = initargs
+        self.executor = None
+        self.start()
+
+    def start(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=init_worker,
+                                            initargs=self.initargs)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def submit(self, chunk):
+        try:
+            return self.executor.submit(solve_chunk, chunk)
+        except BrokenProcessPool:
+            self.start()
+            return self.executor.submit(solve_chunk, chunk)
+
+    def restart(self, pending):
+        """
+        Starts new executor and submits again every `pending` chunk, that
+        didn't finish successfully.
+        """
+        self.start()
+        for item in pending:
+            future = item[1]
+            if not future.done() or future.exception() is not None:
+                item[1] = self.submit(item[0])
+
+    def results(self, chunk, future, pending):
+        """
+        Returns `(solution, error)` list for the `chunk` solved by
+        `future`, starting the pool again if its worker died.
+        """
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self.restart(pending)
+
+        results = []
+        for line in chunk:
+            try:
+                results.extend(self.submit([line]).result())
+            except BrokenProcessPool:
+                results.append((None, self.crash_error))
+                self.restart(pending)
+        return results
+
+
+def solve_parallel(lines, workers=None, engine='backtracking',
+                   select='first', order='ascending', techniques=(),
+                   chunksize=16, ordered=True, timeout=None, stats=None,
+                   budget=None):
+    """
+    Solves puzzles given one per line over a pool of `workers` processes.
+
+    Puzzles are sent to workers as chunks of plain lines and solutions
+    come back as lines of digits, so no boards are pickled. At most
+    2 chunks per worker are in flight, so the input is read lazily.
+
+    Yields `(puzzle, solution, error)` like `sudoku.batch.solve_batch`,
+    in input order, or in completion order if `ordered` is False.
+    A puzzle that raises, runs longer than `timeout` seconds, runs out of
+    `budget` or kills its worker process is reported by its error and
+    doesn't stop the batch. Every worker gets a copy of the budget, so
+    its cancellation token has no effect.
+    """
+    workers = workers or os.cpu_count() or 1
+    limit = 2 * workers
+    chunks = iter_chunks(lines, chunksize)
+    pool = WorkerPool(workers, (engine, select, order, techniques, timeout,
+                                budget))
+    pending = deque()
+    try:
+        while True:
+            for chunk in islice(chunks, limit - len(pending)):
+                pending.append([chunk, pool.submit(chunk)])
+            if not pending:
+                break
+            if ordered:
+                done = [pending[0]]
+            else:
+                finished, _ = wait([item[1] for item in pending],
+                                   return_when=FIRST_COMPLETED)
+                done = [item for item in pending if item[1] in finished]
+            for item in done:
+                pending.remove(item)
+                chunk, future = item
+                results = pool.results(chunk, future, pending)
+                for result in _report(chunk, results, stats):
+                    yield result
+    finally:
+        pool.shutdown()
+    if stats is not None:
+        stats.finished = time.time()
+
+
+def _report(chunk, results, stats):
+    for puzzle, (solution, error) in zip(chunk, results):
+        if solution is not None:
+            solution = Board([int(i) for i in solution])
+        if stats is not None:
+            if solution is None:
+                stats.failed += 1
+            else:
+                stats.solved += 1
+        yield puzzle, solution, error
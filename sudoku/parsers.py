@@ -1,5 +1,8 @@
-import json
-import string
+import argparse
+import mmap
+import os.path
+import struct
+import sys
 from itertools import chain
 from sudoku.board import Board
 
@@ -12,6 +15,9 @@ class ParseError(Exception):
 
 
 class BaseParser(object):
+    # Binary parsers load and dump `bytes` instead of `str`.
+    binary = False
+
     def check_matrix(self, matrix):
         self.check_size(matrix)
         self.check_values(matrix)
@@ -68,8 +74,7 @@ class TextParser(BaseParser):
     def loads(self, s):
         for char in self.free_space_chars:
             s = s.replace(char, '0')
-        for char in string.whitespace:
-            s = s.replace(char, '')
+        s = ''.join(s.split())
         matrix = [int(i) for i in s]
         self.check_matrix(matrix)
         return self.get_board(matrix)
@@ -89,6 +94,95 @@ class TextParser(BaseParser):
         return '\n'.join(output)
 
 
+class LineParser(BaseParser):
+    """
+    Loads boards given one per line without separators, like
+    `data/problems.txt`:
+
+        53..7....6..195....98....6.8...6...34..8.3..17...2...6.6....28....
+
+    Built for bulk loading: characters are converted to cell values by
+    a single `bytes.translate` call with a precomputed table, so there
+    are no per-character conversions. Only boards up to 9x9 fit the
+    format, characters `.`, `_`, `*` and `0` are blanks.
+    """
+    # Number of board cells for every supported board size.
+    sizes = {16: 4, 81: 9}
+
+    def __init__(self, free_space_chars='_*.'):
+        self.free_space_chars = free_space_chars
+        table = bytearray(b'\xff' * 256)
+        for digit in range(10):
+            table[ord(str(digit))] = digit
+        for char in free_space_chars:
+            table[ord(char)] = 0
+        self.table = bytes(table)
+
+    def parse(self, line, number=None):
+        """
+        Returns board of the `line` bytes. `number` of the line goes to
+        the error message.
+        """
+        line = line.strip()
+        values = line.translate(self.table)
+        size = self.sizes.get(len(values))
+        if size is None or max(values) > size:
+            message = self.get_error(line, values)
+            if number is not None:
+                message = 'Line {}: {}'.format(number, message)
+            raise ParseError(message)
+        return self.get_board(values)
+
+    def get_error(self, line, values):
+        """
+        Describes why translated `values` of the `line` are not a board.
+        """
+        size = self.sizes.get(len(values))
+        if size is None:
+            return ('Matrix size must be one of {} cells, {} got'
+                    ' instead.').format(sorted(self.sizes), len(values))
+        for i, n in enumerate(values):
+            if n > size:
+                return ('Unexpected value {!r} on position {}. Expected'
+                        ' value in range(0, {})').format(
+                            chr(line[i]), i, size + 1)
+
+    def loads(self, s):
+        if isinstance(s, str):
+            s = s.encode('ascii', 'replace')
+        return self.parse(s)
+
+    def dumps(self, board):
+        space_char = self.free_space_chars[0]
+        return ''.join(str(value) if value else space_char
+                       for value in board.values)
+
+    def iter_lines(self, lines):
+        """
+        Yields board for every non-blank line of `lines` bytes.
+        """
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                yield self.parse(line, number)
+
+    def iter_file(self, path, use_mmap=False):
+        """
+        Yields board for every non-blank line of the file at `path`.
+        With `use_mmap` the file is memory-mapped instead of read.
+        """
+        with open(path, 'rb') as f:
+            if not use_mmap:
+                yield from self.iter_lines(f)
+                return
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file can't be mapped.
+                return
+            with data:
+                yield from self.iter_lines(iter(data.readline, b''))
+
+
 class JSONParser(BaseParser):
     """
     Loads and dumps sudoku boards in json format (array of arrays
@@ -107,17 +201,261 @@ class JSONParser(BaseParser):
         ]
     """
     def loads(self, s):
+        # `json` is imported by the parser of its format only, it takes
+        # a noticeable share of the command line startup.
+        import json
         matrix = json.loads(s)
         matrix = list(chain(*matrix))
         self.check_matrix(matrix)
         return self.get_board(matrix)
 
     def dumps(self, board):
+        import json
         output = [[cell.value for cell in row] for row in board.rows]
         return json.dumps(output)
 
 
+class BinaryParser(BaseParser):
+    """
+    Loads and dumps boards in compact binary `.sdkb` format:
+
+    1.  12 bytes header: `SDKB` magic, format version, board size, bits
+        per cell, a zero byte and little-endian 32 bit records count.
+    2.  Fixed-width records, one per board. Boards up to 15x15 take 4 bits
+        per cell (41 bytes for 9x9), larger ones a byte per cell.
+
+    Records have the same width, so record `k` starts at `HEADER.size +
+    k * record_size` and the offsets are the index: see `BoardArchive`
+    for random access to a memory-mapped file. `loads` and `dumps` work
+    with `bytes` of a single board archive, `iter_loads` and
+    `dumps_many` with streams of boards.
+    """
+    binary = True
+    magic = b'SDKB'
+    version = 1
+    # Magic, version, board size, bits per cell, records count.
+    header = struct.Struct('<4sBBBxI')
+
+    # Nibbles of every byte, to unpack 4 bits cells by `bytes.translate`.
+    high_nibbles = bytes(i >> 4 for i in range(256))
+    low_nibbles = bytes(i & 0x0f for i in range(256))
+
+    @staticmethod
+    def get_cell_bits(size):
+        return 4 if size < 16 else 8
+
+    @classmethod
+    def get_record_size(cls, size):
+        cells = size * size
+        if cls.get_cell_bits(size) == 4:
+            return (cells + 1) // 2
+        return cells
+
+    def pack_header(self, size, count):
+        return self.header.pack(self.magic, self.version, size,
+                                self.get_cell_bits(size), count)
+
+    def unpack_header(self, data):
+        """
+        Returns `(size, count)` of the archive `data` header.
+        """
+        if len(data) < self.header.size:
+            raise ParseError('Archive is too short for a header.')
+        magic, version, size, bits, count = self.header.unpack_from(data)
+        if magic != self.magic:
+            raise ParseError('Not a binary board archive.')
+        if version != self.version:
+            raise ParseError('Unsupported archive version {}.'.format(
+                version))
+        if bits != self.get_cell_bits(size):
+            raise ParseError('Unexpected {} bits per cell for board size'
+                             ' {}.'.format(bits, size))
+        return size, count
+
+    def pack(self, board):
+        """
+        Returns record bytes of the `board`.
+        """
+        values = bytes(board.values)
+        if self.get_cell_bits(board.size) == 8:
+            return values
+        if len(values) % 2:
+            values += b'\0'
+        # Every nibble fits its byte, so shifted integers don't carry.
+        packed = (int.from_bytes(values[0::2], 'big') << 4 |
+                  int.from_bytes(values[1::2], 'big'))
+        return packed.to_bytes(len(values) // 2, 'big')
+
+    def unpack(self, record, size):
+        """
+        Returns board of the `record` bytes.
+        """
+        cells = size * size
+        if self.get_cell_bits(size) == 8:
+            values = bytearray(record)
+        else:
+            values = bytearray(len(record) * 2)
+            values[0::2] = record.translate(self.high_nibbles)
+            values[1::2] = record.translate(self.low_nibbles)
+            del values[cells:]
+        if max(values) > size:
+            raise ParseError('Unexpected value {} in a board of size'
+                             ' {}.'.format(max(values), size))
+        return self.get_board(values)
+
+    def iter_records(self, data, start=0, stop=None):
+        """
+        Yields boards of archive `data` records from `start` to `stop`.
+        """
+        size, count = self.unpack_header(data)
+        record_size = self.get_record_size(size)
+        if len(data) < self.header.size + count * record_size:
+            raise ParseError('Archive is truncated, {} records'
+                             ' expected.'.format(count))
+        stop = count if stop is None else min(stop, count)
+        offset = self.header.size + start * record_size
+        for _ in range(start, stop):
+            yield self.unpack(data[offset:offset + record_size], size)
+            offset += record_size
+
+    def iter_loads(self, data):
+        """
+        Yields every board of the archive `data`.
+        """
+        return self.iter_records(data)
+
+    def loads(self, s):
+        board = next(self.iter_records(s, 0, 1), None)
+        if board is None:
+            raise ParseError('Archive has no boards.')
+        return board
+
+    def dumps(self, board):
+        return self.dumps_many([board])
+
+    def dumps_many(self, boards):
+        """
+        Returns archive bytes of `boards` of the same size.
+        """
+        boards = list(boards)
+        size = boards[0].size if boards else 9
+        return b''.join(chain(
+            [self.pack_header(size, len(boards))],
+            (self.pack(board) for board in boards)))
+
+    def dump_stream(self, boards, f, size=9):
+        """
+        Writes archive of `boards` stream to the seekable binary file
+        `f`, records count is written when the stream ends. Returns
+        the records count.
+        """
+        start = f.tell()
+        f.write(self.pack_header(size, 0))
+        count = 0
+        for board in boards:
+            if board.size != size:
+                raise ParseError('Board of size {} in archive of size'
+                                 ' {}.'.format(board.size, size))
+            f.write(self.pack(board))
+            count += 1
+        end = f.tell()
+        f.seek(start)
+        f.write(self.pack_header(size, count))
+        f.seek(end)
+        return count
+
+
+class BoardArchive(object):
+    """
+    Random access to boards of `.sdkb` file at `path` through `mmap`:
+    `archive[k]` reads record `k` only, `iter_records(start, stop)` lets
+    workers share one file by record ranges.
+    """
+    def __init__(self, path):
+        self.parser = BinaryParser()
+        with open(path, 'rb') as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ParseError('Archive is too short for a header.')
+        self.size, self.count = self.parser.unpack_header(self.data)
+        self.record_size = self.parser.get_record_size(self.size)
+        expected = self.parser.header.size + self.count * self.record_size
+        if len(self.data) < expected:
+            self.close()
+            raise ParseError('Archive is truncated, {} records'
+                             ' expected.'.format(self.count))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('Record {} out of range.'.format(index))
+        offset = self.parser.header.size + index * self.record_size
+        return self.parser.unpack(
+            self.data[offset:offset + self.record_size], self.size)
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def iter_records(self, start=0, stop=None):
+        return self.parser.iter_records(self.data, start, stop)
+
+    def close(self):
+        self.data.close()
+
+
+def convert(infile, outfile, size=9):
+    """
+    Converts file of one puzzle per line (see `LineParser`) at `infile`
+    path into `.sdkb` archive at `outfile` path, or back if `infile` is
+    an archive. Returns number of converted boards.
+    """
+    if os.path.splitext(infile)[1] == '.sdkb':
+        line_parser = LineParser('.')
+        count = 0
+        with BoardArchive(infile) as archive, open(outfile, 'w') as f:
+            for board in archive:
+                f.write(line_parser.dumps(board))
+                f.write('\n')
+                count += 1
+        return count
+    with open(outfile, 'wb') as f:
+        return BinaryParser().dump_stream(LineParser().iter_file(infile), f,
+                                          size)
+
+
 PARSER_FILE_EXT_MAPPING = {
     '.json': JSONParser,
+    '.sdkb': BinaryParser,
     '.txt': TextParser,
 }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert puzzles between line and .sdkb formats')
+    parser.add_argument('infile', help='Input file, .sdkb or one puzzle'
+                                       ' per line')
+    parser.add_argument('outfile', help='Output file')
+    parser.add_argument('--size', type=int, default=9,
+                        help='Board size of the archive')
+    args = parser.parse_args(argv)
+    try:
+        count = convert(args.infile, args.outfile, args.size)
+    except ParseError as e:
+        parser.exit(1, '{}\n'.format(e))
+    print('Converted {} boards.'.format(count), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
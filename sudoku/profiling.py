@@ -0,0 +1,214 @@
+"""
+Profiler of a solver over a file of puzzles, one per line.
+
+    python -m sudoku profile data/problems.txt --engine backtracking \
+        --strategy degree --techniques all --pstats solve.pstats
+
+The puzzles are solved three times: with plain timing for the slowest
+puzzles and their search stats, under `cProfile` for hot functions and
+under `tracemalloc` for the peak memory of every puzzle and top sites of
+memory the solves leave allocated (caches and leaks), so every
+measurement is free of the overhead of the others. The text report
+goes to stdout or `--report` file, the `cProfile` stats are dumped to
+`--pstats` file for `python -m pstats` or snakeviz.
+"""
+import argparse
+import cProfile
+import io
+import os.path
+import pstats
+import sys
+import time
+import tracemalloc
+from sudoku.parsers import LineParser
+from sudoku.solvers import ENGINES, get_solver
+from sudoku.strategies import ORDERS, SELECTORS
+from sudoku.techniques import technique_names
+
+
+# Counters read from a solver after every solve, if it has them.
+COUNTERS = ['nodes', 'guesses', 'passes']
+
+
+def solve_all(puzzles, solver):
+    for puzzle in puzzles:
+        next(solver.solve(puzzle), None)
+
+
+def time_puzzles(puzzles, solver):
+    """
+    Solves every puzzle with `solver`. Returns list of per-puzzle records
+    with its number, time, search counters and eliminations.
+    """
+    records = []
+    for number, puzzle in enumerate(puzzles):
+        started = time.perf_counter()
+        solution = next(solver.solve(puzzle), None)
+        record = {
+            'puzzle': number,
+            'time': time.perf_counter() - started,
+            'solved': solution is not None,
+            'eliminations': dict(getattr(solver, 'eliminations', {})),
+        }
+        for counter in COUNTERS:
+            record[counter] = getattr(solver, counter, None)
+        records.append(record)
+    return records
+
+
+def profile_puzzles(puzzles, solver):
+    """
+    Solves every puzzle under `cProfile`. Returns `pstats.Stats`.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(solve_all, puzzles, solver)
+    return pstats.Stats(profiler)
+
+
+def trace_puzzles(puzzles, solver, records):
+    """
+    Solves every puzzle under `tracemalloc`, the peak of traced memory
+    over every solve goes to 'memory' of its record from `records`.
+    Returns `(peak, statistics)`: the peak in bytes and list of
+    `tracemalloc.StatisticDiff` by line of the memory, that the solves
+    left allocated.
+    """
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ]
+    peak = 0
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(filters)
+        for puzzle, record in zip(puzzles, records):
+            tracemalloc.reset_peak()
+            started, _ = tracemalloc.get_traced_memory()
+            next(solver.solve(puzzle), None)
+            _, puzzle_peak = tracemalloc.get_traced_memory()
+            record['memory'] = puzzle_peak - started
+            peak = max(peak, puzzle_peak)
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+    finally:
+        tracemalloc.stop()
+    return peak, after.compare_to(before, 'lineno')
+
+
+def format_stats(stats, sort, top):
+    """
+    Formats `top` functions of `pstats.Stats` sorted by `sort` key.
+    """
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(top)
+    # Skip the header of the totals, it is the same for every sort key.
+    lines = stream.getvalue().splitlines()
+    start = next((n for n, line in enumerate(lines)
+                  if line.lstrip().startswith('ncalls')), 0)
+    return '\n'.join(line for line in lines[start:] if line.strip())
+
+
+def module_times(stats):
+    """
+    Returns list of `(seconds, module)` of the own time of functions of
+    every module file, from the slowest one.
+    """
+    times = {}
+    for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+        # Built-in functions have '~' for the file name.
+        module = os.path.basename(filename) if filename != '~' else 'builtins'
+        times[module] = times.get(module, 0.0) + tottime
+    return sorted(((seconds, module) for module, seconds in times.items()),
+                  reverse=True)
+
+
+def format_slowest(records, count):
+    """
+    Formats `count` slowest puzzles of `records` with search stats.
+    """
+    row = '{:>7} {:>9} {:>10} {:>9} {:>9} {:>7}  {}'
+    lines = [row.format('line', 'time', 'memory', 'nodes', 'guesses',
+                        'passes', 'eliminations')]
+    slowest = sorted(records, key=lambda record: record['time'],
+                     reverse=True)
+    for record in slowest[:count]:
+        eliminations = ', '.join(
+            '{} {}'.format(name, eliminated)
+            for name, eliminated in sorted(record['eliminations'].items()))
+        lines.append(row.format(
+            record['puzzle'] + 1, '{:.4f}s'.format(record['time']),
+            '{:.1f}KiB'.format(record.get('memory', 0) / 1024.0),
+            *[('-' if record[counter] is None else record[counter])
+              for counter in COUNTERS] + [eliminations or '-']))
+    return '\n'.join(lines)
+
+
+def format_report(records, stats, peak, allocations, top=20,
+                  slowest=10):
+    """
+    Formats the text report of the timing `records`, `cProfile` `stats`,
+    `tracemalloc` `peak` and `allocations` left by the solves.
+    """
+    total = sum(record['time'] for record in records)
+    solved = sum(1 for record in records if record['solved'])
+    sections = [
+        'Solved {} of {} puzzles in {:.3f}s ({:.4f}s per puzzle).'.format(
+            solved, len(records), total,
+            total / len(records) if records else 0.0),
+        'Slowest puzzles:\n' + format_slowest(records, slowest),
+        'Own time by module:\n' + '\n'.join(
+            '{:>9.3f}s  {}'.format(seconds, module)
+            for seconds, module in module_times(stats)[:top]),
+        'Hot functions by own time:\n' + format_stats(stats, 'tottime',
+                                                      top),
+        'Hot functions by cumulative time:\n' + format_stats(
+            stats, 'cumulative', top),
+        'Peak traced memory: {:.1f} KiB.'.format(peak / 1024.0),
+        'Top allocation sites left after the solves:\n' + '\n'.join(
+            str(statistic) for statistic in allocations[:top]),
+    ]
+    return '\n\n'.join(sections) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m sudoku profile',
+        description='Profile a solver over a file of puzzles')
+    parser.add_argument('puzzles', help='File with one puzzle per line')
+    parser.add_argument('--engine', choices=ENGINES, default='backtracking',
+                        help='Solver engine')
+    parser.add_argument('--strategy', choices=sorted(SELECTORS),
+                        default='first', help='Cell selection strategy')
+    parser.add_argument('--order', choices=sorted(ORDERS),
+                        default='ascending', help='Candidates order')
+    parser.add_argument('--techniques', type=technique_names, default=[],
+                        help='Comma separated propagation techniques, or'
+                             ' "all"')
+    parser.add_argument('--limit', type=int,
+                        help='Profile only the first puzzles of the file')
+    parser.add_argument('--top', type=int, default=20,
+                        help='Number of functions and allocation sites')
+    parser.add_argument('--slowest', type=int, default=10,
+                        help='Number of the slowest puzzles')
+    parser.add_argument('--report', type=argparse.FileType('w'),
+                        default=sys.stdout, help='Text report file')
+    parser.add_argument('--pstats', default='sudoku.pstats',
+                        help='cProfile stats dump file')
+    args = parser.parse_args(argv)
+
+    puzzles = list(LineParser().iter_file(args.puzzles))[:args.limit]
+    solver = get_solver(args.engine, args.strategy, args.order,
+                        args.techniques)
+    records = time_puzzles(puzzles, solver)
+    stats = profile_puzzles(puzzles, solver)
+    stats.dump_stats(args.pstats)
+    peak, allocations = trace_puzzles(puzzles, solver, records)
+    args.report.write(format_report(records, stats, peak, allocations,
+                                    args.top, args.slowest))
+    print('cProfile stats are saved to {}.'.format(args.pstats),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
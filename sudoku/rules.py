@@ -1,40 +1,561 @@
+def count_in_unit(board, unit, value):
+    values = board.values
+    return [values[index] for index in unit].count(value)
+
+
 def unique_in_row(board, cell):
-    row = board.get_row(cell.y)
-    return row.count(cell) < 2
+    row = board.layout.rows[cell.y]
+    return count_in_unit(board, row, cell.value) < 2
 
 
 def unique_in_column(board, cell):
-    column = board.get_column(cell.x)
-    return column.count(cell) < 2
+    column = board.layout.columns[cell.x]
+    return count_in_unit(board, column, cell.value) < 2
 
 
 def unique_in_square(board, cell):
-    square = board.get_square_by_cell(cell.x, cell.y)
-    return square.count(cell) < 2
+    layout = board.layout
+    index = board.size * cell.y + cell.x
+    square = layout.squares[layout.cell_squares[index]]
+    return count_in_unit(board, square, cell.value) < 2
+
+
+# Built-in rules that are answered by unit bitmasks of `Constraints`
+# instead of being called for every candidate.
+UNIT_RULES = {
+    unique_in_row: 'rows',
+    unique_in_column: 'columns',
+    unique_in_square: 'squares',
+}
+
+
+class UnitRule(object):
+    """
+    Declarative rule, that `RuleHandler` compiles into extra units of
+    `Constraints`: groups of cells, that hold different digits. Such
+    rules are answered by unit bitmasks like the built-in ones instead of
+    being called for every candidate.
+
+    `kind` names units of the rule in conflicts and `get_units` returns
+    tuples of cell indexes of every unit on the `layout`. `totals` lists
+    digit sums of the units, if they have ones.
+    """
+    kind = None
+    totals = None
+
+    def get_units(self, layout):
+        raise NotImplementedError
+
+    def get_indexes(self, layout, cells):
+        """
+        Returns tuple of indexes of `cells` given by `(x, y)`.
+        """
+        size = layout.size
+        for x, y in cells:
+            if not (0 <= x < size and 0 <= y < size):
+                raise ValueError('Cell ({}, {}) is out of the board.'.format(
+                    x, y))
+        return tuple(size * y + x for x, y in cells)
+
+
+class AllDifferent(UnitRule):
+    """
+    Every group of `groups`, a list of `(x, y)` cells, holds different
+    digits.
+    """
+    def __init__(self, groups, kind='groups'):
+        self.groups = [list(cells) for cells in groups]
+        self.kind = kind
+
+    def get_units(self, layout):
+        return [self.get_indexes(layout, cells) for cells in self.groups]
+
+
+class Diagonals(UnitRule):
+    """
+    Both main diagonals hold different digits (X-Sudoku).
+    """
+    kind = 'diagonals'
+
+    def get_units(self, layout):
+        size = layout.size
+        return [
+            tuple(size * n + n for n in range(size)),
+            tuple(size * n + size - 1 - n for n in range(size)),
+        ]
+
+
+class Windows(UnitRule):
+    """
+    Extra squares placed one cell off the standard ones hold different
+    digits (Hyper Sudoku, 4 windows on 9x9 board).
+    """
+    kind = 'windows'
+
+    def get_units(self, layout):
+        size = layout.size
+        square_size = layout.square_size
+        starts = range(1, size - square_size, square_size + 1)
+        return [
+            tuple(size * (top + y) + left + x
+                  for y in range(square_size)
+                  for x in range(square_size))
+            for top in starts
+            for left in starts
+        ]
+
+
+class Cages(UnitRule):
+    """
+    Killer cages: `cages` is a list of `(total, cells)`, where `cells` are
+    `(x, y)` of the cage, that hold different digits adding up to `total`.
+    """
+    kind = 'cages'
+
+    def __init__(self, cages):
+        self.cages = [(total, list(cells)) for total, cells in cages]
+        self.totals = [total for total, _ in self.cages]
+
+    def get_units(self, layout):
+        return [self.get_indexes(layout, cells) for _, cells in self.cages]
+
+
+class ForbiddenOffsets(UnitRule):
+    """
+    Cells `(dx, dy)` of `offsets` apart can't hold the same digit. Every
+    such pair of cells is a unit of 2 cells, so it takes the same
+    bitmask check as rows and columns.
+    """
+    def __init__(self, offsets, kind='offsets'):
+        self.offsets = list(offsets)
+        self.kind = kind
+
+    def get_units(self, layout):
+        size = layout.size
+        pairs = set()
+        for y in range(size):
+            for x in range(size):
+                for dx, dy in self.offsets:
+                    if 0 <= x + dx < size and 0 <= y + dy < size:
+                        pairs.add(tuple(sorted(
+                            (size * y + x, size * (y + dy) + x + dx))))
+        return sorted(pairs)
+
+
+class AntiKnight(ForbiddenOffsets):
+    """
+    Cells a chess knight's move apart can't hold the same digit.
+    """
+    def __init__(self):
+        super(AntiKnight, self).__init__(
+            [(1, 2), (2, 1), (-1, 2), (-2, 1)], 'knight_moves')
+
+
+class AntiKing(ForbiddenOffsets):
+    """
+    Cells touching diagonally can't hold the same digit, cells touching
+    by a side already share a row or column.
+    """
+    def __init__(self):
+        super(AntiKing, self).__init__([(1, 1), (-1, 1)], 'king_moves')
+
+
+class CageSum(object):
+    """
+    Digits of a cage of `length` cells, that add up to `total`. Every
+    combination of `length` different digits up to `size` with the sum
+    is a bitmask of `combinations`, so the digits left for empty cells of
+    the cage are found by the mask of digits already used.
+    """
+    def __init__(self, total, length, size):
+        self.total = total
+        self.length = length
+        self.combinations = list(self.get_combinations(total, length, 1,
+                                                       size))
+        self.memo = {}
+
+    def get_combinations(self, total, length, lowest, highest):
+        if not length:
+            if not total:
+                yield 0
+            return
+        for digit in range(lowest, min(highest, total) + 1):
+            for mask in self.get_combinations(total - digit, length - 1,
+                                              digit + 1, highest):
+                yield mask | 1 << digit
+
+    def allowed(self, used):
+        """
+        Returns bitmask of digits that could complete the cage with
+        `used` digits mask.
+        """
+        mask = self.memo.get(used)
+        if mask is None:
+            mask = 0
+            for combination in self.combinations:
+                if combination & used == used:
+                    mask |= combination
+            mask = self.memo[used] = mask & ~used
+        return mask
+
+    def fits(self, used):
+        """
+        Checks that cage with `used` digits mask could add up to the
+        total.
+        """
+        return any(combination & used == used
+                   for combination in self.combinations)
+
+
+class UnitTables(object):
+    """
+    Unit tables of `RuleHandler` rules for boards of the `layout` size:
+    units of built-in rules of `kinds` in `Layout.kinds` order, then
+    units of every `UnitRule` of `unit_rules`.
+
+    1.  `cell_units`, `unit_cells` and `peers` are like the tables of
+        `Layout.get_unit_tables`.
+    2.  `unit_kinds` names the kind of every unit and `unit_numbers`
+        gives its number among the units of the kind.
+    3.  `houses` lists units of `size` cells, every digit goes once to
+        each of them.
+    4.  `sums` maps units with a digit sum to their `CageSum` and
+        `cell_sums` lists `(unit, cage_sum)` of every cell.
+    """
+    def __init__(self, layout, kinds, unit_rules=()):
+        size = layout.size
+        self.kinds = tuple(kind for kind in layout.kinds if kind in kinds)
+        cell_units, unit_cells, peers = layout.get_unit_tables(kinds)
+        unit_kinds = [kind for kind in self.kinds for _ in range(size)]
+        unit_numbers = [n for _ in self.kinds for n in range(size)]
+        totals = [None] * len(unit_cells)
+        if unit_rules:
+            cell_units = [list(units) for units in cell_units]
+            unit_cells = list(unit_cells)
+            for rule in unit_rules:
+                units = rule.get_units(layout)
+                for number, cells in enumerate(units):
+                    for index in cells:
+                        cell_units[index].append(len(unit_cells))
+                    unit_cells.append(tuple(cells))
+                    unit_kinds.append(rule.kind)
+                    unit_numbers.append(number)
+                totals.extend(rule.totals or [None] * len(units))
+            cell_units = tuple(tuple(units) for units in cell_units)
+            unit_cells = tuple(unit_cells)
+            peers = tuple(
+                tuple(sorted(set(
+                    other for unit in units for other in unit_cells[unit]
+                ) - {index}))
+                for index, units in enumerate(cell_units)
+            )
+        self.cell_units = cell_units
+        self.unit_cells = unit_cells
+        self.peers = peers
+        self.unit_kinds = tuple(unit_kinds)
+        self.unit_numbers = tuple(unit_numbers)
+        self.houses = tuple(
+            unit for unit, cells in enumerate(unit_cells)
+            if len(cells) == size)
+        self.sums = {
+            unit: CageSum(total, len(unit_cells[unit]), size)
+            for unit, total in enumerate(totals) if total is not None
+        }
+        self.cell_sums = tuple(
+            tuple((unit, self.sums[unit]) for unit in units
+                  if unit in self.sums)
+            for units in cell_units
+        )
+
+
+class Constraints(object):
+    """
+    Incremental constraint engine bound to a single board.
+
+    Keeps "used digits" bitmask for every unit of `tables` (see
+    `UnitTables`), so checking that digit fits a cell takes a couple of
+    integer operations. Digit `d` is represented by bit `1 << d`.
+
+    `kinds` names the kinds of built-in units covered, `unit_kinds`
+    names the kind of every unit. `unit_cells` lists cell indexes of
+    every unit and `peers` lists indexes of cells sharing at least one
+    unit with every cell. `houses` lists units, that hold every digit.
+
+    `consistent` is False if the board already has the same digit twice
+    in some unit or a cage, that can't add up to its sum. Such board has
+    no solutions.
+
+    Callers must report every cell change through `set` and `clear`.
+    Digit sums of cages are looked up by the used digits of the cage.
+    Rules that are arbitrary callables are checked through the fallback
+    path, that temporarily puts the digit on the board and calls them.
+    """
+    def __init__(self, board, tables, fallback_rules=()):
+        self.board = board
+        self.fallback_rules = list(fallback_rules)
+        self.full_mask = ((1 << board.size) - 1) << 1
+        self.kinds = tables.kinds
+        self.cell_units = tables.cell_units
+        self.unit_cells = tables.unit_cells
+        self.peers = tables.peers
+        self.unit_kinds = tables.unit_kinds
+        self.houses = tables.houses
+        self.cell_sums = tables.cell_sums
+        # Both sums and callable rules are off the fast path of `allowed`.
+        self.checked = bool(tables.sums or self.fallback_rules)
+        self.used = [0] * len(self.unit_cells)
+
+        self.consistent = True
+        used = self.used
+        for index, value in enumerate(board.values):
+            if not value:
+                continue
+            bit = 1 << value
+            for unit in self.cell_units[index]:
+                if used[unit] & bit:
+                    self.consistent = False
+                used[unit] |= bit
+        for unit, cage_sum in tables.sums.items():
+            if not cage_sum.fits(used[unit]):
+                self.consistent = False
+
+    def set(self, index, value):
+        """
+        Marks `value` as used by all units of the cell with `index`.
+        """
+        bit = 1 << value
+        used = self.used
+        for unit in self.cell_units[index]:
+            used[unit] |= bit
+
+    def clear(self, index, value):
+        """
+        Reverts `set` call for the cell with `index`.
+        """
+        mask = ~(1 << value)
+        used = self.used
+        for unit in self.cell_units[index]:
+            used[unit] &= mask
+
+    def allowed(self, index):
+        """
+        Returns bitmask of digits that could be put into the cell with
+        `index` without breaking any rule.
+        """
+        used = self.used
+        mask = self.full_mask
+        for unit in self.cell_units[index]:
+            mask &= ~used[unit]
+        if self.checked and mask:
+            for unit, cage_sum in self.cell_sums[index]:
+                mask &= cage_sum.allowed(used[unit])
+            if self.fallback_rules and mask:
+                mask = self.check_fallback(index, mask)
+        return mask
+
+    def is_allowed(self, index, value):
+        """
+        Checks that `value` could be put into the cell with `index`.
+        """
+        return bool(self.allowed(index) & (1 << value))
+
+    def check_fallback(self, index, mask):
+        """
+        Filters digits of `mask` through the callable rules.
+        """
+        board = self.board
+        cell = board[index]
+        old_value = cell.value
+        for value in iter_bits(mask):
+            cell.value = value
+            if not all(rule(board, cell) for rule in self.fallback_rules):
+                mask &= ~(1 << value)
+        cell.value = old_value
+        return mask
+
+
+def iter_bits(mask):
+    """
+    Yields digits which bits are set in `mask`, in ascending order.
+    """
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+
+class Conflict(object):
+    """
+    First rule violation found by `RuleHandler.validate`.
+
+    `rule` is the unit kind ('rows', 'columns', 'squares' or `kind` of
+    a `UnitRule`) with the digit repeated, 'sums' for a cage, that can't
+    add up to its total `value`, 'empty' for an empty cell of a board
+    that must be complete, 'range' for a value larger than the board
+    size or the name of a callable rule. `unit` is the unit number of
+    its kind and `positions` lists `(x, y)` coordinates of the cells
+    involved.
+    """
+    def __init__(self, rule, value, positions, unit=None):
+        self.rule = rule
+        self.value = value
+        self.positions = positions
+        self.unit = unit
+
+    def __repr__(self):
+        return '<Conflict: {}>'.format(self)
+
+    def __str__(self):
+        positions = ' and '.join(str(p) for p in self.positions)
+        if self.rule == 'empty':
+            return 'Cell {} is empty.'.format(positions)
+        if self.rule == 'range':
+            return 'Unexpected value {} at {}.'.format(self.value, positions)
+        if self.rule == 'sums':
+            return 'Digits of cage {} at {} can\'t add up to {}.'.format(
+                self.unit, positions, self.value)
+        if self.unit is None:
+            return 'Digit {} at {} breaks rule {}.'.format(
+                self.value, positions, self.rule)
+        return 'Digit {} repeats in {} {} at {}.'.format(
+            self.value, self.rule[:-1], self.unit, positions)
 
 
 class RuleHandler(object):
     """
     Object that handles game rules and can tell that specific cell
     doesn't break rules on the board.
+
+    Built-in rules and `UnitRule` rules are compiled into `UnitTables`
+    once per board size, other callable rules are the slow fallback.
     """
     default_rules = [unique_in_row, unique_in_column, unique_in_square]
 
     def __init__(self, rules=None):
         self.rules = []
+        self.units = []
+        self.unit_rules = []
+        self.fallback_rules = []
+        self._tables = {}
         for rule in rules or self.default_rules:
             self.add_rule(rule)
 
     def add_rule(self, rule):
         """
-        Adds game rule. The `rule` must be a callable, that takes
-        2 arguments: `board` and `cell`. Must return True if cell
-        fits board, False otherwise.
+        Adds game rule. The `rule` must be a `UnitRule` or a callable,
+        that takes 2 arguments: `board` and `cell`. Must return True if
+        cell fits board, False otherwise.
         """
         self.rules.append(rule)
+        self._tables.clear()
+        if isinstance(rule, UnitRule):
+            self.unit_rules.append(rule)
+        elif rule in UNIT_RULES:
+            self.units.append(UNIT_RULES[rule])
+        else:
+            self.fallback_rules.append(rule)
+
+    def get_tables(self, layout):
+        """
+        Returns `UnitTables` of the rules for boards of the `layout`.
+        """
+        tables = self._tables.get(layout.size)
+        if tables is None:
+            tables = self._tables[layout.size] = UnitTables(
+                layout, self.units, self.unit_rules)
+        return tables
 
     def is_valid(self, board, cell):
         """
-        Validates that specified cell fits all defined rules
+        Validates that specified cell fits all defined rules. Built-in
+        and unit rules are checked over the unit tables, other rules are
+        called.
+        """
+        tables = self.get_tables(board.layout)
+        index = board.size * cell.y + cell.x
+        value = cell.value
+        values = board.values
+        for unit in tables.cell_units[index]:
+            for other in tables.unit_cells[unit]:
+                if other != index and values[other] == value:
+                    return False
+        for unit, cage_sum in tables.cell_sums[index]:
+            if not cage_sum.fits(self.get_used(values,
+                                               tables.unit_cells[unit])):
+                return False
+        return all(rule(board, cell) for rule in self.fallback_rules)
+
+    def get_used(self, values, cells):
+        """
+        Returns bitmask of digits in `cells` of board `values`.
+        """
+        used = 0
+        for index in cells:
+            used |= 1 << values[index]
+        return used & ~1
+
+    def validate(self, board, complete=False):
+        """
+        Checks the whole `board` against all rules. Returns the first
+        `Conflict` found or None if the board is valid. With `complete`
+        empty cells are conflicts too, so a valid board is solved.
+
+        Built-in and unit rules take a single pass over every unit with
+        a bitmask of used digits, callable rules are called for every
+        filled cell.
+        """
+        values = board.values
+        size = board.size
+        if complete and 0 in values:
+            index = values.index(0)
+            return Conflict('empty', 0, [divmod(index, size)[::-1]])
+        if max(values) > size:
+            index = values.index(max(values))
+            return Conflict('range', values[index],
+                            [divmod(index, size)[::-1]])
+        tables = self.get_tables(board.layout)
+        for unit, cells in enumerate(tables.unit_cells):
+            used = 0
+            for index in cells:
+                value = values[index]
+                if value:
+                    bit = 1 << value
+                    if used & bit:
+                        return self.get_unit_conflict(board, unit, cells,
+                                                      index)
+                    used |= bit
+        for unit, cage_sum in sorted(tables.sums.items()):
+            cells = tables.unit_cells[unit]
+            if not cage_sum.fits(self.get_used(values, cells)):
+                return Conflict(
+                    'sums', cage_sum.total,
+                    [divmod(index, size)[::-1] for index in cells],
+                    tables.unit_numbers[unit])
+        for rule in self.fallback_rules:
+            for cell in board:
+                if cell.value and not rule(board, cell):
+                    return Conflict(rule.__name__, cell.value,
+                                    [cell.coords])
+        return None
+
+    def get_unit_conflict(self, board, unit, cells, index):
+        """
+        Returns `Conflict` of the digit of the cell with `index`, that
+        repeats an earlier cell of `unit` with `cells` indexes.
+        """
+        values = board.values
+        value = values[index]
+        first = next(i for i in cells if values[i] == value)
+        tables = self.get_tables(board.layout)
+        size = board.size
+        return Conflict(
+            tables.unit_kinds[unit], value,
+            [divmod(first, size)[::-1], divmod(index, size)[::-1]],
+            tables.unit_numbers[unit])
+
+    def constraints(self, board):
+        """
+        Returns incremental constraint engine for the `board`.
         """
-        return all(rule(board, cell) for rule in self.rules)
+        return Constraints(board, self.get_tables(board.layout),
+                           self.fallback_rules)
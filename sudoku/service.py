@@ -0,0 +1,314 @@
+"""
+Solving service for asyncio code: solves run in a bounded pool of worker
+processes, so the event loop doesn't stall on CPU-bound search.
+
+    solution = await solve_async(board)
+
+    async with SolverService(workers=4, timeout=10) as service:
+        solution = await service.solve(board, timeout=1)
+
+JSON-lines server over stdin and stdout, or TCP with `--port`:
+
+    python -m sudoku.service --port 8765 --workers 4 --engine dlx
+
+Every request line is a JSON object with `puzzle` (line of digits and
+dots or array of rows), optional `id` and `timeout` seconds. The response
+line has the same `id`, `solution` in the format of the puzzle or null
+and `error`. Responses are written as solves finish, not in order.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
+from sudoku.board import Board
+from sudoku.parallel import _worker, init_worker
+from sudoku.parsers import JSONParser, LineParser, ParseError
+from sudoku.solvers import Budget, ENGINES, SolveTimeout
+from sudoku.strategies import ORDERS, SELECTORS
+from sudoku.techniques import technique_names
+
+
+def solve_values(values):
+    """
+    Solves puzzle of board `values` bytes inside a worker. Returns bytes
+    of the first solution or None.
+    """
+    solution = next(_worker['solver'].solve(
+        Board(values), _worker['timeout'], _worker['budget']), None)
+    return bytes(solution.values) if solution is not None else None
+
+
+class SolverService(object):
+    """
+    Solves puzzles for asyncio code over a pool of `workers` processes
+    with solver of `engine`, `select`, `order` and `techniques` (see
+    `sudoku.solvers.get_solver`).
+
+    1.  At most `max_pending` solves (2 per worker by default) are in
+        the pool at once, other callers of `solve` wait for a free slot.
+    2.  Concurrent requests for the same puzzle share a single solve.
+    3.  Workers stop every solve after `timeout` seconds or `max_nodes`
+        search nodes with `BudgetExceeded`, so a pathological puzzle
+        can't hold a worker forever. `solve` also takes per-request
+        `timeout`, that stops waiting but not the shared solve.
+
+    `solves` counts solves sent to the pool and `coalesced` counts
+    requests, that joined a solve already in flight.
+    """
+    def __init__(self, workers=None, engine='backtracking', select='first',
+                 order='ascending', techniques=(), max_pending=None,
+                 timeout=None, max_nodes=None):
+        self.workers = workers or os.cpu_count() or 1
+        budget = None
+        if timeout is not None or max_nodes is not None:
+            budget = Budget(timeout, max_nodes)
+        self.initargs = (engine, select, order, techniques, None, budget)
+        self.max_pending = max_pending or 2 * self.workers
+        self.executor = None
+        self.slots = None
+        self.in_flight = {}
+        self.solves = 0
+        self.coalesced = 0
+        self.start()
+
+    def start(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=init_worker,
+                                            initargs=self.initargs)
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    async def solve(self, puzzle, timeout=None):
+        """
+        Returns the first solution board of the `puzzle` or None if it
+        has no solutions. Raises `SolveTimeout` after `timeout` seconds
+        and `BudgetExceeded` if the worker budget runs out.
+        """
+        key = (puzzle.size, bytes(puzzle.values))
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.run(key[1]))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.finished(key))
+        else:
+            self.coalesced += 1
+        try:
+            values = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise SolveTimeout('Timed out after {}s.'.format(timeout),
+                               'time', elapsed=timeout)
+        return Board(values) if values is not None else None
+
+    def finished(self, key):
+        future = self.in_flight.pop(key)
+        # Every waiter could be gone by a timeout, so the error of the
+        # solve is retrieved here to keep asyncio from logging it.
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, values):
+        """
+        Solves board `values` in the pool, when a slot is free.
+        """
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending)
+        async with self.slots:
+            self.solves += 1
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self.executor,
+                                                  solve_values, values)
+            except BrokenProcessPool:
+                # The pool is lost for every solve in flight, start it
+                # again for the next ones.
+                self.start()
+                raise
+
+
+# Service of `solve_async`, started by the first call.
+_service = None
+
+
+async def solve_async(puzzle, timeout=None):
+    """
+    Solves `puzzle` with the shared default `SolverService`, see
+    `SolverService.solve`.
+    """
+    global _service
+    if _service is None:
+        _service = SolverService()
+    return await _service.solve(puzzle, timeout)
+
+
+def load_puzzle(puzzle):
+    """
+    Returns board of request `puzzle`: line string or array of rows.
+    """
+    if isinstance(puzzle, str):
+        return LineParser().loads(puzzle)
+    if not isinstance(puzzle, list) or not all(
+            isinstance(row, list) for row in puzzle):
+        raise ParseError('Puzzle must be a line or an array of rows.')
+    matrix = list(chain(*puzzle))
+    parser = JSONParser()
+    parser.check_matrix(matrix)
+    return parser.get_board(matrix)
+
+
+def dump_solution(puzzle, solution):
+    """
+    Returns `solution` board in the format of request `puzzle`.
+    """
+    if isinstance(puzzle, str):
+        return ''.join(map(str, solution.values))
+    return [[cell.value for cell in row] for row in solution.rows]
+
+
+async def handle_request(service, line):
+    """
+    Returns response dict of the JSON request `line`.
+    """
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError('Request must be a JSON object.')
+    except ValueError as e:
+        return {'id': None, 'solution': None, 'error': str(e)}
+    response = {'id': request.get('id'), 'solution': None, 'error': None}
+    try:
+        puzzle = load_puzzle(request.get('puzzle'))
+        solution = await service.solve(puzzle, request.get('timeout'))
+    except Exception as e:
+        response['error'] = str(e) or type(e).__name__
+        return response
+    if solution is None:
+        response['error'] = 'No solution could be found.'
+    else:
+        response['solution'] = dump_solution(request['puzzle'], solution)
+    return response
+
+
+async def serve_lines(service, reader, write, max_requests=None):
+    """
+    Answers JSON-lines requests from `reader` stream, every response line
+    goes to `write` callable. Reading pauses while `max_requests` (4 per
+    pending solve by default) requests are not answered yet.
+    """
+    requests = asyncio.Semaphore(max_requests or 4 * service.max_pending)
+    tasks = set()
+
+    async def answer(line):
+        try:
+            response = await handle_request(service, line)
+            await write(json.dumps(response) + '\n')
+        finally:
+            requests.release()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        await requests.acquire()
+        task = asyncio.ensure_future(answer(line.decode()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+async def serve_tcp(service, host, port, max_requests=None):
+    """
+    Returns started `asyncio` server, that answers JSON-lines requests of
+    every connection.
+    """
+    async def connected(reader, writer):
+        async def write(line):
+            writer.write(line.encode())
+            await writer.drain()
+        try:
+            await serve_lines(service, reader, write, max_requests)
+        finally:
+            writer.close()
+    return await asyncio.start_server(connected, host, port)
+
+
+async def serve_stdio(service, max_requests=None):
+    """
+    Answers JSON-lines requests from stdin on stdout until stdin ends.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    async def write(line):
+        sys.stdout.write(line)
+        sys.stdout.flush()
+    await serve_lines(service, reader, write, max_requests)
+
+
+async def serve(args):
+    service = SolverService(args.workers, args.engine, args.strategy,
+                            args.order, args.techniques, args.max_pending,
+                            args.timeout, args.max_nodes)
+    async with service:
+        if args.port is None:
+            await serve_stdio(service)
+            return
+        server = await serve_tcp(service, args.host, args.port)
+        async with server:
+            print('Serving on {}:{}'.format(
+                args.host, server.sockets[0].getsockname()[1]),
+                file=sys.stderr)
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='JSON-lines sudoku solving server')
+    parser.add_argument('--port', type=int,
+                        help='TCP port, stdin and stdout are used without it')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host')
+    parser.add_argument('--workers', type=int,
+                        help='Number of worker processes, every CPU by'
+                             ' default')
+    parser.add_argument('--max-pending', type=int,
+                        help='Solves in the pool at once, 2 per worker by'
+                             ' default')
+    parser.add_argument('--engine', choices=ENGINES, default='backtracking',
+                        help='Solver engine')
+    parser.add_argument('--strategy', choices=sorted(SELECTORS),
+                        default='first', help='Cell selection strategy')
+    parser.add_argument('--order', choices=sorted(ORDERS),
+                        default='ascending', help='Candidates order')
+    parser.add_argument('--techniques', type=technique_names, default=[],
+                        help='Comma separated propagation techniques, or'
+                             ' "all"')
+    parser.add_argument('--timeout', type=float,
+                        help='Seconds a worker gives every solve')
+    parser.add_argument('--max-nodes', type=int,
+                        help='Search nodes a worker gives every solve')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
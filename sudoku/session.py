@@ -0,0 +1,208 @@
+from sudoku.rules import RuleHandler, iter_bits
+from sudoku.solvers import BacktrackingSolver, SearchState
+from sudoku.strategies import DegreeSelector
+from sudoku.techniques import TECHNIQUES, Contradiction, get_techniques
+
+
+class Hint(object):
+    """
+    Value for the cell at `x`, `y` and the `reason` it is known by:
+    'naked_single', technique name from `sudoku.techniques` or
+    'solution' if it takes a guess.
+    """
+    def __init__(self, x, y, value, reason):
+        self.x = x
+        self.y = y
+        self.value = value
+        self.reason = reason
+
+    def __repr__(self):
+        return '<Hint: {} at ({}, {}) by {}>'.format(
+            self.value, self.x, self.y, self.reason)
+
+
+class SolverSession(object):
+    """
+    Board of an interactive game, that keeps its solving state between
+    moves instead of solving from scratch after every one.
+
+    1.  `set_cell` and `clear_cell` update the board and its constraints
+        incrementally, clues of the puzzle can't be changed and a move
+        breaking the rules raises `ValueError`. `undo` and `redo` replay
+        the moves.
+    2.  `candidates` reads the constraints bitmasks.
+    3.  `is_solvable` checks the board against the known solution and
+        solves again only when a move disagrees with it. Results are
+        remembered by board, so undone and redone positions are free.
+    4.  `hint` finds the next cell, that follows from the board by naked
+        singles or `techniques`. Techniques only remove candidates of
+        a temporary search state, so the board is not changed.
+    """
+    # Boards remembered by `is_solvable`, the memo is dropped when full.
+    memo_size = 1024
+
+    def __init__(self, puzzle, rules=None, techniques=None):
+        self.board = puzzle.copy()
+        self.rules = rules or RuleHandler()
+        self.constraints = self.rules.constraints(self.board)
+        if not self.constraints.consistent:
+            raise ValueError('Puzzle breaks the rules.')
+        if techniques is None:
+            techniques = get_techniques(TECHNIQUES)
+        self.techniques = list(techniques)
+        self.solver = BacktrackingSolver(self.rules, DegreeSelector(),
+                                         techniques=self.techniques)
+        self.clues = frozenset(
+            index for index, value in enumerate(self.board.values) if value)
+        self.undo_moves = []
+        self.redo_moves = []
+        self.solution = None
+        self.memo = {}
+
+    def get_index(self, x, y):
+        size = self.board.size
+        if not (0 <= x < size and 0 <= y < size):
+            raise ValueError('Cell ({}, {}) is out of the board.'.format(
+                x, y))
+        return size * y + x
+
+    def set_cell(self, x, y, value):
+        """
+        Puts `value` into the cell at `x`, `y`.
+        """
+        index = self.get_index(x, y)
+        if not 1 <= value <= self.board.size:
+            raise ValueError('Unexpected value {}.'.format(value))
+        self.move(index, value)
+
+    def clear_cell(self, x, y):
+        """
+        Empties the cell at `x`, `y`.
+        """
+        self.move(self.get_index(x, y), 0)
+
+    def move(self, index, value):
+        y, x = divmod(index, self.board.size)
+        if index in self.clues:
+            raise ValueError('Cell ({}, {}) is a clue.'.format(x, y))
+        old_value = self.board.values[index]
+        if value == old_value:
+            return
+        self.put(index, 0)
+        if value and not self.constraints.is_allowed(index, value):
+            self.put(index, old_value)
+            raise ValueError('Digit {} breaks the rules at ({}, {}).'.format(
+                value, x, y))
+        self.put(index, value)
+        self.undo_moves.append((index, old_value, value))
+        del self.redo_moves[:]
+
+    def put(self, index, value):
+        values = self.board.values
+        if values[index]:
+            self.constraints.clear(index, values[index])
+        values[index] = value
+        if value:
+            self.constraints.set(index, value)
+
+    def undo(self):
+        """
+        Takes back the last move. Returns False if there are no moves.
+        """
+        if not self.undo_moves:
+            return False
+        index, old_value, value = self.undo_moves.pop()
+        self.put(index, old_value)
+        self.redo_moves.append((index, old_value, value))
+        return True
+
+    def redo(self):
+        """
+        Makes again the last move taken back. Returns False if there are
+        no such moves.
+        """
+        if not self.redo_moves:
+            return False
+        index, old_value, value = self.redo_moves.pop()
+        self.put(index, value)
+        self.undo_moves.append((index, old_value, value))
+        return True
+
+    @property
+    def is_solved(self):
+        return 0 not in self.board.values
+
+    def candidates(self, x, y):
+        """
+        Returns digits, that could be put into the cell at `x`, `y`.
+        """
+        index = self.get_index(x, y)
+        if self.board.values[index]:
+            return []
+        return list(iter_bits(self.constraints.allowed(index)))
+
+    def get_solution(self):
+        """
+        Returns solution board of the current board or None if the moves
+        made it unsolvable.
+        """
+        values = self.board.values
+        solution = self.solution
+        if solution is not None and all(
+                value == expected or not value
+                for value, expected in zip(values, solution.values)):
+            return solution
+        key = bytes(values)
+        if key not in self.memo:
+            if len(self.memo) >= self.memo_size:
+                self.memo.clear()
+            self.memo[key] = next(self.solver.solve(self.board), None)
+        if self.memo[key] is not None:
+            self.solution = self.memo[key]
+        return self.memo[key]
+
+    def is_solvable(self):
+        """
+        Checks that the board still has a solution.
+        """
+        return self.get_solution() is not None
+
+    def hint(self):
+        """
+        Returns `Hint` for the next cell or None if the board is solved or
+        unsolvable.
+        """
+        if self.is_solved or not self.is_solvable():
+            return None
+        return self.find_hint(SearchState(self.board, self.constraints))
+
+    def find_hint(self, state):
+        values = state.values
+        candidates = state.candidates
+        allowed = self.constraints.allowed
+        size = self.board.size
+        for index, value in enumerate(values):
+            if not value:
+                state.restrict(index, allowed(index))
+        reason = 'naked_single'
+        while True:
+            for index, value in enumerate(values):
+                mask = candidates[index]
+                if not value and mask and not mask & (mask - 1):
+                    return Hint(index % size, index // size,
+                                mask.bit_length() - 1, reason)
+            for technique in self.techniques:
+                try:
+                    eliminated = technique.apply(state)
+                except Contradiction:
+                    return None
+                if eliminated:
+                    reason = technique.name
+                    break
+            else:
+                break
+
+        # Nothing follows by logic, take the value of the solution.
+        index = values.index(0)
+        return Hint(index % size, index // size,
+                    self.get_solution().values[index], 'solution')
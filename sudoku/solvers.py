@@ -1,15 +1,417 @@
-from contextlib import contextmanager
-import copy
+import time
+from itertools import islice
+from sudoku.board import Board
+from sudoku.rules import RuleHandler
+from sudoku.strategies import (ORDERS, SELECTORS, FirstEmptySelector,
+                               ValueOrder, count_bits)
+from sudoku.techniques import Contradiction, get_techniques
 
 
-@contextmanager
-def tmp_value(cell, value):
+class BudgetExceeded(Exception):
     """
-    Sets cell value inside context.
+    Error raised by a solver when the solve runs out of its `Budget`.
+    Unlike the end of solutions it means that the search is not over.
+
+    `reason` is 'time', 'nodes' or 'cancelled'. `nodes`, `guesses`,
+    `solutions` found and `elapsed` seconds are partial stats of the
+    solve.
+    """
+    def __init__(self, message='Budget exceeded.', reason=None, nodes=0,
+                 guesses=0, solutions=0, elapsed=0.0):
+        super(BudgetExceeded, self).__init__(message)
+        self.reason = reason
+        self.nodes = nodes
+        self.guesses = guesses
+        self.solutions = solutions
+        self.elapsed = elapsed
+
+    def __reduce__(self):
+        # Keeps partial stats when the error comes from a worker process.
+        return type(self), (str(self), self.reason, self.nodes,
+                            self.guesses, self.solutions, self.elapsed)
+
+
+class SolveTimeout(BudgetExceeded):
+    """
+    Error raised by a solver when the solve takes longer than its timeout.
+    """
+    pass
+
+
+class SolveCancelled(BudgetExceeded):
+    """
+    Error raised by a solver when its `CancelToken` is cancelled.
+    """
+    pass
+
+
+class CancelToken(object):
+    """
+    Flag, that another thread or an event loop sets with `cancel` to stop
+    solves with a `Budget` of this token at their next search node.
+    """
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Budget(object):
+    """
+    Limits of a solve: `timeout` seconds, `max_nodes` search nodes,
+    `max_solutions` solutions yielded and cancellation `token`. Every
+    limit is optional.
+
+    The solver calls `start` when the solve begins and `check` on every
+    search node, that raises `BudgetExceeded` once a limit is over.
+    Running out of `max_solutions` just ends the solutions. A budget
+    could be reused by solves that run one after another.
+    """
+    def __init__(self, timeout=None, max_nodes=None, max_solutions=None,
+                 token=None):
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.max_solutions = max_solutions
+        self.token = token
+        self.started = None
+        self.deadline = None
+
+    def start(self):
+        self.started = time.monotonic()
+        if self.timeout is not None:
+            self.deadline = self.started + self.timeout
+        return self
+
+    def check(self, nodes, guesses, solutions):
+        """
+        Raises `BudgetExceeded` if the search with `nodes` visited,
+        `guesses` and `solutions` found so far can't visit one more node.
+        """
+        if self.token is not None and self.token.cancelled:
+            self.exceeded(SolveCancelled, 'Solve cancelled.', 'cancelled',
+                          nodes, guesses, solutions)
+        if self.max_nodes is not None and nodes >= self.max_nodes:
+            self.exceeded(BudgetExceeded, 'Node limit of {} reached.'.format(
+                self.max_nodes), 'nodes', nodes, guesses, solutions)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceeded(SolveTimeout, 'Timed out after {}s.'.format(
+                self.timeout), 'time', nodes, guesses, solutions)
+
+    def exceeded(self, error, message, reason, nodes, guesses, solutions):
+        raise error(message, reason, nodes, guesses, solutions,
+                    time.monotonic() - self.started)
+
+    def limit(self, solutions):
+        """
+        Returns iterator over `solutions` cut at `max_solutions`.
+        """
+        return islice(solutions, self.max_solutions)
+
+
+def get_budget(timeout=None, budget=None):
+    """
+    Returns started `budget`, or a new one of `timeout` seconds if no
+    budget is given. Returns None if there are no limits at all.
+    """
+    if budget is None:
+        if timeout is None:
+            return None
+        budget = Budget(timeout)
+    elif timeout is not None:
+        raise ValueError('Give either timeout or budget.')
+    return budget.start()
+
+
+class SolutionCount(object):
+    """
+    Result of solutions counting: `count` of solutions found, whether the
+    counting stopped at `limit`, and `nodes`, `guesses` and `elapsed`
+    seconds of the search.
+    """
+    def __init__(self, count, limit, nodes, guesses, elapsed):
+        self.count = count
+        self.limit = limit
+        self.nodes = nodes
+        self.guesses = guesses
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return '<SolutionCount: {}{}>'.format(
+            self.count, '+' if self.limit_reached else '')
+
+    @property
+    def limit_reached(self):
+        return self.limit is not None and self.count >= self.limit
+
+    @classmethod
+    def collect(cls, solver, solutions, limit):
+        """
+        Counts `solutions` of `solver` search until `limit` is reached.
+        """
+        started = time.perf_counter()
+        count = 0
+        if limit is None or limit > 0:
+            for _ in solutions:
+                count += 1
+                if count == limit:
+                    break
+        return cls(count, limit, solver.nodes, solver.guesses,
+                   time.perf_counter() - started)
+
+
+class SearchState(object):
+    """
+    Mutable state of the search over a single working board.
+
+    Holds candidates bitmask for every cell and the trail of changes made
+    since the search started. Every assignment and candidates removal is
+    recorded on the trail, so a failed branch is rolled back with `undo`
+    to a previously saved `mark` instead of copying the whole state.
+    `nodes` counts search nodes visited over the state, `guesses` counts
+    values tried by branching, `solutions` counts solutions found and
+    `passes` counts sweeps of naked singles over the board. The search
+    stops with `BudgetExceeded` when `budget` runs out. `eliminations`
+    counts candidates removed by every technique name. `tracer` receives
+    events of traced search, see `sudoku.tracing.Tracer`.
+    """
+    def __init__(self, board, constraints):
+        self.board = board
+        self.values = board.values
+        self.constraints = constraints
+        self.candidates = [
+            0 if value else constraints.full_mask for value in self.values
+        ]
+        self.trail = []
+        self.nodes = 0
+        self.guesses = 0
+        self.passes = 0
+        self.solutions = 0
+        self.budget = None
+        self.eliminations = {}
+        self.tracer = None
+
+    def mark(self):
+        """
+        Returns trail position to roll back to later.
+        """
+        return len(self.trail)
+
+    def undo(self, mark):
+        """
+        Rolls back every change made after `mark`.
+        """
+        trail = self.trail
+        values = self.values
+        candidates = self.candidates
+        while len(trail) > mark:
+            index, mask = trail.pop()
+            if mask is None:
+                self.constraints.clear(index, values[index])
+                values[index] = 0
+            else:
+                candidates[index] = mask
+
+    def assign(self, index, value):
+        """
+        Puts `value` into the cell with `index`.
+        """
+        self.values[index] = value
+        self.constraints.set(index, value)
+        self.trail.append((index, None))
+
+    def restrict(self, index, mask):
+        """
+        Narrows candidates of the cell with `index` down to `mask`.
+        """
+        old_mask = self.candidates[index]
+        if mask != old_mask:
+            self.trail.append((index, old_mask))
+            self.candidates[index] = mask
+
+    def eliminate(self, index, mask):
+        """
+        Removes digits of `mask` from candidates of the empty cell with
+        `index`. Returns number of removed candidates.
+        """
+        if self.values[index]:
+            return 0
+        old_mask = self.candidates[index]
+        removed = old_mask & mask
+        if not removed:
+            return 0
+        self.restrict(index, old_mask ^ removed)
+        return count_bits(removed)
+
+    def propagate(self, techniques=()):
+        """
+        Fills naked singles until nothing changes, then runs `techniques`
+        in order. The first technique that removes any candidate starts
+        the loop again, so cheaper techniques go first. Returns False if
+        the board has no solution.
+        """
+        eliminations = self.eliminations
+        while True:
+            if not self.fill_singles():
+                return False
+            for technique in techniques:
+                try:
+                    eliminated = technique.apply(self)
+                except Contradiction:
+                    return False
+                if eliminated:
+                    eliminations[technique.name] = (
+                        eliminations.get(technique.name, 0) + eliminated)
+                    if self.tracer is not None:
+                        self.tracer.eliminated(self, technique.name,
+                                               eliminated)
+                    break
+            else:
+                return True
+
+    def fill_singles(self):
+        """
+        Removes candidates breaking the rules and fills every cell that
+        has the only one candidate left, until nothing changes.
+        Returns False if some cell has no candidates at all.
+        """
+        values = self.values
+        candidates = self.candidates
+        allowed = self.constraints.allowed
+        while True:
+            self.passes += 1
+            has_changed = False
+            for index, value in enumerate(values):
+                if value:
+                    continue
+                mask = candidates[index] & allowed(index)
+                self.restrict(index, mask)
+                if not mask:
+                    return False
+                if not mask & (mask - 1):
+                    self.assign(index, mask.bit_length() - 1)
+                    has_changed = True
+            if not has_changed:
+                return True
+
+
+class Search(object):
+    """
+    Depth-first search of `BacktrackingSolver` over `state`, that keeps
+    guesses on an explicit stack instead of recursion, so the search depth
+    is not bounded by the recursion limit and a solution costs the same
+    at any depth.
+
+    Iteration yields `state` every time its board is solved. Every frame
+    of `stack` is `[index, mark, values, position]`: the cell guessed,
+    trail mark to undo to, values to try and position of the next one.
+    `descend` tells that the next step visits a new search node.
+
+    Between solutions the search could be saved with `checkpoint` and
+    continued later by `BacktrackingSolver.resume`.
     """
-    cell.value = value
-    yield
-    cell.value = 0
+    def __init__(self, solver, state):
+        self.solver = solver
+        self.state = state
+        self.puzzle = bytes(state.values)
+        self.stack = []
+        self.descend = state.constraints.consistent
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        state = self.state
+        stack = self.stack
+        techniques = self.solver.techniques
+        select_cell = self.solver.select.select_cell
+        order_values = self.solver.order.order_values
+        budget = state.budget
+        descend = self.descend
+        while True:
+            if descend:
+                if budget is not None:
+                    budget.check(state.nodes, state.guesses, state.solutions)
+                state.nodes += 1
+                if state.propagate(techniques):
+                    index = select_cell(state)
+                    if index is None:
+                        self.descend = False
+                        state.solutions += 1
+                        return state
+                    values = list(order_values(state, index))
+                    stack.append([index, state.mark(), values, 0])
+
+            # Try the next value of the latest guess, that has one left.
+            descend = False
+            while stack:
+                frame = stack[-1]
+                index, mark, values, position = frame
+                state.undo(mark)
+                if position < len(values):
+                    frame[3] = position + 1
+                    state.guesses += 1
+                    state.assign(index, values[position])
+                    descend = True
+                    break
+                stack.pop()
+            self.descend = descend
+            if not descend:
+                raise StopIteration
+
+    def solutions(self):
+        """
+        Returns generator for a copy of the board on every solution, up to
+        `max_solutions` of the budget.
+        """
+        board = self.state.board
+        search = self
+        if self.state.budget is not None:
+            search = self.state.budget.limit(search)
+        for _ in search:
+            yield board.copy()
+
+    def checkpoint(self):
+        """
+        Returns JSON serializable dict of the search progress.
+        """
+        state = self.state
+        return {
+            'puzzle': list(self.puzzle),
+            'stack': [[index, values, position]
+                      for index, _, values, position in self.stack],
+            'descend': self.descend,
+            'nodes': state.nodes,
+            'guesses': state.guesses,
+            'passes': state.passes,
+            'solutions': state.solutions,
+            'eliminations': dict(state.eliminations),
+        }
+
+    def restore(self, checkpoint):
+        """
+        Replays guesses of the `checkpoint` over the fresh search state.
+        Propagation must be the same as when the checkpoint was made, so
+        the solver must have the same rules and techniques.
+        """
+        state = self.state
+        stack = checkpoint['stack']
+        self.descend = checkpoint['descend']
+        if stack and not state.propagate(self.solver.techniques):
+            raise ValueError('Checkpoint does not match the solver.')
+        for number, (index, values, position) in enumerate(stack, 1):
+            self.stack.append([index, state.mark(), values, position])
+            state.assign(index, values[position - 1])
+            # The latest guess isn't propagated yet if its node is next.
+            if number == len(stack) and self.descend:
+                break
+            if not state.propagate(self.solver.techniques):
+                raise ValueError('Checkpoint does not match the solver.')
+        state.nodes = checkpoint['nodes']
+        state.guesses = checkpoint['guesses']
+        state.passes = checkpoint['passes']
+        state.solutions = checkpoint['solutions']
+        state.eliminations = dict(checkpoint['eliminations'])
 
 
 class BacktrackingSolver(object):
@@ -26,9 +428,12 @@ class BacktrackingSolver(object):
     2.  Find every obvious situation, when cell has only one candidate
         and fill it with the candidate.
     3.  Repeat 1, 2 in cycle until there is now candidates changes and
-        no obvious cell values left.
-    4.  Find first cell with several candidates and try to fill it with first
-        one. Try steps 1-3. There are 3 situations available:
+        no obvious cell values left. Then apply `techniques` (see
+        `sudoku.techniques`), every one that removes candidates makes
+        the cycle start again.
+    4.  Find a cell with several candidates and try to fill it with one
+        of them. The cell and the candidates order are chosen by
+        `select` and `order`. Try steps 1-3. There are 3 situations available:
         1.  The board is solved. Then return the current board layout as
             the solution.
         2.  The board layout became unsolvable. Undo all steps till last
@@ -37,40 +442,457 @@ class BacktrackingSolver(object):
         3.  The board is neither solved nor unsolvable. Repeat step 4.
 
     Finally we would find a solution or find out that it does not exist.
+
+    The search works on a single copy of the puzzle. Instead of copying
+    the board on every prediction, all changes are recorded on the trail
+    of `SearchState` and undone when the prediction fails.
+
+    With `tracer` the solver runs `traced_search`, that reports search
+    events to the tracer (see `sudoku.tracing`).
     """
-    def __init__(self, rules):
+    def __init__(self, rules, select=None, order=None, techniques=(),
+                 tracer=None):
         self.rules = rules
+        self.select = select or FirstEmptySelector()
+        self.order = order or ValueOrder()
+        self.techniques = list(techniques)
+        self.tracer = tracer
+        self.state = None
+
+    @property
+    def nodes(self):
+        """
+        Number of search nodes visited by the last `solve` call.
+        """
+        return self.state.nodes if self.state is not None else 0
 
-    def solve(self, puzzle, candidates=None):
+    @property
+    def guesses(self):
         """
-        Returns generator for every puzzle solution.
+        Number of values tried by branching during the last `solve` call.
         """
-        solution = copy.deepcopy(puzzle)
-        candidates = copy.deepcopy(candidates) or {}
-        default_candidates = range(1, solution.size + 1)
+        return self.state.guesses if self.state is not None else 0
 
+    @property
+    def passes(self):
+        """
+        Number of propagation sweeps during the last `solve` call.
+        """
+        return self.state.passes if self.state is not None else 0
+
+    @property
+    def eliminations(self):
+        """
+        Candidates removed by every technique during the last `solve` call.
+        """
+        return self.state.eliminations if self.state is not None else {}
+
+    def solve(self, puzzle, timeout=None, budget=None):
+        """
+        Returns generator for every puzzle solution. Raises `SolveTimeout`
+        if search runs longer than `timeout` seconds, or `BudgetExceeded`
+        when `budget` runs out (see `Budget`).
+        """
+        board = puzzle.copy()
+        for _ in self.search_board(board, timeout, budget):
+            yield board.copy()
+
+    def start(self, puzzle, timeout=None, budget=None):
+        """
+        Returns resumable `Search` over a copy of the `puzzle`. Unlike
+        `solve` it doesn't report events to the tracer.
+        """
+        return Search(self, self.create_state(puzzle.copy(), timeout,
+                                              budget))
+
+    def resume(self, checkpoint, timeout=None, budget=None):
+        """
+        Returns `Search` continued from the `checkpoint` dict, see
+        `Search.checkpoint`.
+        """
+        search = self.start(Board(checkpoint['puzzle']), timeout, budget)
+        search.restore(checkpoint)
+        return search
+
+    def count(self, puzzle, limit=None, timeout=None, budget=None):
+        """
+        Counts puzzle solutions up to `limit`, see `count_solutions`.
+        """
+        return SolutionCount.collect(
+            self, self.search_board(puzzle.copy(), timeout, budget), limit)
+
+    def search_board(self, board, timeout=None, budget=None):
+        """
+        Returns generator, that yields every time `board` is solved in
+        place. Raises `SolveTimeout` if search runs longer than `timeout`
+        seconds, or `BudgetExceeded` when `budget` runs out.
+        """
+        state = self.create_state(board, timeout, budget)
+        if not state.constraints.consistent:
+            return
+        if self.tracer is None:
+            search = self.search(state)
+        else:
+            state.tracer = self.tracer
+            self.tracer.start(state)
+            search = self.traced_search(state, 0)
+        if state.budget is not None:
+            search = state.budget.limit(search)
+        yield from search
+
+    def create_state(self, board, timeout=None, budget=None):
+        """
+        Returns `SearchState` over the `board`, that stops the search
+        after `timeout` seconds or when `budget` runs out.
+        """
+        constraints = self.rules.constraints(board)
+        state = self.state = SearchState(board, constraints)
+        state.budget = get_budget(timeout, budget)
+        return state
+
+    def search(self, state):
+        """
+        Returns iterator, that yields every time the working board of
+        `state` becomes solved, see `Search`.
+        """
+        return Search(self, state)
+
+    def traced_search(self, state, depth):
+        """
+        Same as `search`, but reports every step to `state.tracer`.
+        `depth` is the number of guesses made on the way to the node.
+        """
+        tracer = state.tracer
+        if state.budget is not None:
+            state.budget.check(state.nodes, state.guesses, state.solutions)
+        state.nodes += 1
+        tracer.propagate_start(state)
+        consistent = state.propagate(self.techniques)
+        tracer.propagate_end(state, consistent)
+        if not consistent:
+            return
+
+        tracer.select_start(state)
+        index = self.select.select_cell(state)
+        if index is not None:
+            values = list(self.order.order_values(state, index))
+        tracer.select_end(state, index)
+        if index is None:
+            state.solutions += 1
+            tracer.solution(state)
+            yield state
+            return
+
+        mark = state.mark()
+        depth += 1
+        for value in values:
+            state.guesses += 1
+            tracer.guess(state, index, value, depth)
+            state.assign(index, value)
+            yield from self.traced_search(state, depth)
+            state.undo(mark)
+            tracer.backtrack(state, index, value, depth)
+
+
+class DLXSolver(object):
+    """
+    This solver reduces the puzzle to the exact cover problem and solves it
+    with Knuth's Algorithm X over Dancing Links, see `ExactCoverMatrix`.
+
+    Only standard rules are supported: the solver doesn't take
+    `RuleHandler`, so puzzles with extra rules must go to
+    `BacktrackingSolver`.
+    """
+    def __init__(self):
+        self.matrix = None
+
+    @property
+    def nodes(self):
+        """
+        Number of search nodes visited by the last `solve` call.
+        """
+        return self.matrix.nodes if self.matrix is not None else 0
+
+    @property
+    def guesses(self):
+        """
+        Number of matrix rows tried during the last `solve` call.
+        """
+        return self.matrix.guesses if self.matrix is not None else 0
+
+    def solve(self, puzzle, timeout=None, budget=None):
+        """
+        Returns generator for every puzzle solution. Raises `SolveTimeout`
+        if search runs longer than `timeout` seconds, or `BudgetExceeded`
+        when `budget` runs out (see `Budget`).
+        """
+        size = puzzle.size
+        matrix = self.prepare(puzzle, timeout, budget)
+        if matrix is None:
+            return
+
+        for rows in matrix.search():
+            solution = puzzle.copy()
+            values = solution.values
+            for node in rows:
+                index, digit = divmod(matrix.candidate[node], size)
+                values[index] = digit + 1
+            yield solution
+
+    def count(self, puzzle, limit=None, timeout=None, budget=None):
+        """
+        Counts puzzle solutions up to `limit`, see `count_solutions`.
+        """
+        matrix = self.prepare(puzzle, timeout, budget)
+        search = matrix.search() if matrix is not None else iter(())
+        return SolutionCount.collect(self, search, limit)
+
+    def prepare(self, puzzle, timeout=None, budget=None):
+        """
+        Returns `ExactCoverMatrix` of the `puzzle` with clues selected,
+        or None if clues conflict.
+        """
+        matrix = self.matrix = ExactCoverMatrix(puzzle.layout)
+        matrix.budget = get_budget(timeout, budget)
+        if not matrix.select_clues(puzzle.values):
+            return None
+        return matrix
+
+
+class ExactCoverMatrix(object):
+    """
+    Exact cover matrix of the sudoku board of `layout` size.
+
+    Every candidate (cell, digit) is a matrix row, that covers 4 columns:
+    the cell itself and the digit in the cell's row, column and square.
+    Matrix nodes are doubly linked in both directions through flat lists
+    of node indexes. The node 0 is the root and nodes 1..N are column
+    headers. `nodes` counts search nodes visited over the matrix,
+    `guesses` counts rows tried and `solutions` counts exact covers found.
+    The search stops with `BudgetExceeded` when `budget` runs out and
+    after its `max_solutions` covers.
+    """
+    def __init__(self, layout):
+        size = layout.size
+        cells = size * size
+        columns = 4 * cells
+        self.nodes = 0
+        self.guesses = 0
+        self.solutions = 0
+        self.budget = None
+        self.left = [columns] + list(range(columns))
+        self.right = list(range(1, columns + 1)) + [0]
+        self.up = list(range(columns + 1))
+        self.down = list(range(columns + 1))
+        self.column = list(range(columns + 1))
+        self.candidate = [None] * (columns + 1)
+        self.sizes = [0] * (columns + 1)
+        self.row_nodes = []
+
+        for index in range(cells):
+            row = layout.cell_rows[index] * size
+            column = layout.cell_columns[index] * size
+            square = layout.cell_squares[index] * size
+            for digit in range(size):
+                self.add_row(index * size + digit, (
+                    1 + index,
+                    1 + cells + row + digit,
+                    1 + 2 * cells + column + digit,
+                    1 + 3 * cells + square + digit,
+                ))
+
+    def select_clues(self, values):
+        """
+        Covers columns of every clue of board `values`. Returns False if
+        clues conflict, so the board has no solutions.
+        """
+        size = int(round(len(values) ** 0.5))
+        covered = [False] * len(self.sizes)
+        for index, value in enumerate(values):
+            if not value:
+                continue
+            row = self.row_nodes[index * size + value - 1]
+            for node in self.row_of(row):
+                column = self.column[node]
+                if covered[column]:
+                    return False
+                covered[column] = True
+                self.cover(column)
+        return True
+
+    def add_row(self, candidate, columns):
+        """
+        Appends matrix row for `candidate` covering `columns`.
+        """
+        left, right, up, down = self.left, self.right, self.up, self.down
+        first = len(left)
+        last = first + len(columns) - 1
+        self.row_nodes.append(first)
+        for node, column in enumerate(columns, first):
+            left.append(node - 1 if node > first else last)
+            right.append(node + 1 if node < last else first)
+            up.append(up[column])
+            down.append(column)
+            down[up[column]] = node
+            up[column] = node
+            self.column.append(column)
+            self.candidate.append(candidate)
+            self.sizes[column] += 1
+
+    def row_of(self, node):
+        """
+        Yields every node of the matrix row, starting from `node`.
+        """
+        yield node
+        right = self.right
+        other = right[node]
+        while other != node:
+            yield other
+            other = right[other]
+
+    def cover(self, column):
+        """
+        Unlinks `column` header and every row intersecting it.
+        """
+        left, right, up, down = self.left, self.right, self.up, self.down
+        column_of, sizes = self.column, self.sizes
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        row = down[column]
+        while row != column:
+            node = right[row]
+            while node != row:
+                down[up[node]] = down[node]
+                up[down[node]] = up[node]
+                sizes[column_of[node]] -= 1
+                node = right[node]
+            row = down[row]
+
+    def uncover(self, column):
+        """
+        Reverts `cover` call for `column`.
+        """
+        left, right, up, down = self.left, self.right, self.up, self.down
+        column_of, sizes = self.column, self.sizes
+        row = up[column]
+        while row != column:
+            node = left[row]
+            while node != row:
+                sizes[column_of[node]] += 1
+                down[up[node]] = node
+                up[down[node]] = node
+                node = left[node]
+            row = up[row]
+        right[left[column]] = column
+        left[right[column]] = column
+
+    def choose_column(self):
+        """
+        Returns uncovered column with the fewest rows left.
+        """
+        right, sizes = self.right, self.sizes
+        best = None
+        column = right[0]
+        while column != 0:
+            if best is None or sizes[column] < sizes[best]:
+                best = column
+                if sizes[column] < 2:
+                    break
+            column = right[column]
+        return best
+
+    def search(self):
+        """
+        Returns generator, that yields list of selected row nodes for every
+        exact cover found. The search is iterative, so its depth is not
+        bounded by the recursion limit.
+        """
+        right, left, down = self.right, self.left, self.down
+        max_solutions = None
+        if self.budget is not None:
+            max_solutions = self.budget.max_solutions
+            if max_solutions == 0:
+                return
+        column_of = self.column
+        budget = self.budget
+        rows = []
         while True:
-            has_changed = False
-            for cell in (c for c in solution if c.is_empty):
-                bad_candidates = set()
-                if cell not in candidates:
-                    candidates[cell] = set(default_candidates)
-                for candidate in candidates[cell]:
-                    with tmp_value(cell, candidate):
-                        if not self.rules.is_valid(solution, cell):
-                            bad_candidates.add(candidate)
-                candidates[cell] -= bad_candidates
-                if len(candidates[cell]) == 1:
-                    cell.value = candidates[cell].pop()
-                    has_changed = True
-                elif cell.is_empty and not candidates[cell]:
-                    raise StopIteration
-            if not has_changed:
-                break
+            if budget is not None:
+                budget.check(self.nodes, self.guesses, self.solutions)
+            self.nodes += 1
+            if right[0] == 0:
+                self.solutions += 1
+                yield rows
+                if self.solutions == max_solutions:
+                    return
+                column = None
+            else:
+                column = self.choose_column()
+
+            if column is not None and down[column] != column:
+                self.cover(column)
+                row = down[column]
+                node = right[row]
+                while node != row:
+                    self.cover(column_of[node])
+                    node = right[node]
+                rows.append(row)
+                self.guesses += 1
+                continue
+
+            # Backtrack to the latest row with an untried alternative.
+            while True:
+                if not rows:
+                    return
+                row = rows.pop()
+                node = left[row]
+                while node != row:
+                    self.uncover(column_of[node])
+                    node = left[node]
+                column = column_of[row]
+                row = down[row]
+                if row != column:
+                    node = right[row]
+                    while node != row:
+                        self.cover(column_of[node])
+                        node = right[node]
+                    rows.append(row)
+                    self.guesses += 1
+                    break
+                self.uncover(column)
+
 
-        for cell in (c for c in solution if c.is_empty):
-            for candidate in candidates[cell]:
-                with tmp_value(cell, candidate):
-                    yield from self.solve(solution, candidates)
-            raise StopIteration
-        yield solution
+ENGINES = ['backtracking', 'dlx']
+
+
+def count_solutions(puzzle, limit=None, solver=None, timeout=None,
+                    budget=None):
+    """
+    Counts solutions of the `puzzle` and stops as soon as `limit` of them
+    are found. Solution boards are not built. Uses `DLXSolver` unless
+    other `solver` is given. Returns `SolutionCount`.
+    """
+    solver = solver if solver is not None else DLXSolver()
+    return solver.count(puzzle, limit, timeout, budget)
+
+
+def is_unique(puzzle, solver=None, timeout=None, budget=None):
+    """
+    Checks that the `puzzle` has exactly one solution.
+    """
+    return count_solutions(puzzle, 2, solver, timeout, budget).count == 1
+
+
+def get_solver(engine='backtracking', select='first', order='ascending',
+               techniques=(), tracer=None):
+    """
+    Returns solver by `engine` name. Backtracking solver uses standard
+    rules, cell selector by `select` name from `SELECTORS`, value order
+    by `order` name from `ORDERS`, propagation techniques by names from
+    `TECHNIQUES` and `tracer`.
+    """
+    if engine == 'dlx':
+        return DLXSolver()
+    return BacktrackingSolver(RuleHandler(), SELECTORS[select](),
+                              ORDERS[order](), get_techniques(techniques),
+                              tracer)
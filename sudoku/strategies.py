@@ -0,0 +1,125 @@
+from sudoku.rules import iter_bits
+
+
+if hasattr(int, 'bit_count'):
+    count_bits = int.bit_count
+else:
+    def count_bits(mask):
+        """
+        Returns number of bits set in `mask`.
+        """
+        return bin(mask).count('1')
+
+
+class CellSelector(object):
+    """
+    Decides which cell the solver makes prediction for.
+    """
+    def select_cell(self, state):
+        """
+        Returns index of the cell to branch on, or None if every cell of
+        the `state` board is filled.
+        """
+        raise NotImplementedError
+
+
+class FirstEmptySelector(CellSelector):
+    """
+    Branches on the first empty cell in board order.
+    """
+    def select_cell(self, state):
+        for index, value in enumerate(state.values):
+            if not value:
+                return index
+        return None
+
+
+class MinimumRemainingValuesSelector(CellSelector):
+    """
+    Branches on the empty cell with the fewest candidates left. A tie is
+    broken by the least `tie_key`, then by board order.
+    """
+    def select_cell(self, state):
+        best_index = None
+        best_count = None
+        best_key = None
+        candidates = state.candidates
+        for index, value in enumerate(state.values):
+            if value:
+                continue
+            count = count_bits(candidates[index])
+            if best_count is None or count < best_count:
+                best_index, best_count, best_key = index, count, None
+            elif count == best_count:
+                if best_key is None:
+                    best_key = self.tie_key(state, best_index)
+                key = self.tie_key(state, index)
+                if key < best_key:
+                    best_index, best_key = index, key
+        return best_index
+
+    def tie_key(self, state, index):
+        """
+        Returns key to choose between cells with equal number of
+        candidates, the least one wins.
+        """
+        return 0
+
+
+class DegreeSelector(MinimumRemainingValuesSelector):
+    """
+    Minimum remaining values selector, that breaks a tie by choosing the
+    cell with the most empty peers.
+    """
+    def tie_key(self, state, index):
+        values = state.values
+        degree = 0
+        for peer in state.constraints.peers[index]:
+            if not values[peer]:
+                degree += 1
+        return -degree
+
+
+class ValueOrder(object):
+    """
+    Decides in which order candidates of the selected cell are tried.
+    Tries them in ascending order.
+    """
+    def order_values(self, state, index):
+        """
+        Returns candidates of the cell with `index` in the order they
+        should be tried.
+        """
+        return iter_bits(state.candidates[index])
+
+
+class LeastConstrainingValueOrder(ValueOrder):
+    """
+    Tries first the candidates ruling out the fewest candidates of empty
+    peers.
+    """
+    def order_values(self, state, index):
+        values = state.values
+        candidates = state.candidates
+        masks = [
+            candidates[p] for p in state.constraints.peers[index]
+            if not values[p]
+        ]
+
+        def constrained(value):
+            bit = 1 << value
+            return sum(1 for mask in masks if mask & bit)
+
+        return sorted(iter_bits(candidates[index]), key=constrained)
+
+
+SELECTORS = {
+    'first': FirstEmptySelector,
+    'mrv': MinimumRemainingValuesSelector,
+    'degree': DegreeSelector,
+}
+
+ORDERS = {
+    'ascending': ValueOrder,
+    'lcv': LeastConstrainingValueOrder,
+}
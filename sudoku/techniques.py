@@ -0,0 +1,265 @@
+import argparse
+from itertools import combinations
+from sudoku.rules import iter_bits
+from sudoku.strategies import count_bits
+
+
+class Contradiction(Exception):
+    """
+    Error raised by a technique when the board can't be solved anymore.
+    """
+    pass
+
+
+class Technique(object):
+    """
+    Inference technique, that removes candidates proven wrong by the
+    units of the board. `SearchState.propagate` runs techniques after
+    naked singles stop filling cells.
+
+    Techniques rely on unit tables of the state constraints only, so
+    they stay correct with extra callable rules. Techniques with
+    `houses` look at units, that hold every digit, only: a cage or
+    a pair of cells of a variant rule could miss some digits.
+    """
+    name = None
+    houses = False
+
+    def apply(self, state):
+        """
+        Removes candidates from empty cells of the `state` board. Returns
+        number of removed candidates, raises `Contradiction` if the board
+        has no solution.
+        """
+        raise NotImplementedError
+
+    def iter_units(self, state):
+        """
+        Yields `(unit, cells)` for every unit of the `state` board, or
+        every house with `houses`, where `cells` lists empty cells of the
+        unit.
+        """
+        values = state.values
+        constraints = state.constraints
+        units = constraints.unit_cells
+        for unit in (constraints.houses if self.houses
+                     else range(len(units))):
+            cells = [index for index in units[unit] if not values[index]]
+            if cells:
+                yield unit, cells
+
+    def get_places(self, state, cells):
+        """
+        Returns dict, that maps every digit to the list of `cells` having
+        the digit among candidates.
+        """
+        candidates = state.candidates
+        places = {}
+        for index in cells:
+            for digit in iter_bits(candidates[index]):
+                places.setdefault(digit, []).append(index)
+        return places
+
+
+class HiddenSingles(Technique):
+    """
+    A digit, that fits the only cell of a unit, goes to that cell.
+    """
+    name = 'hidden_singles'
+    houses = True
+
+    def apply(self, state):
+        candidates = state.candidates
+        used = state.constraints.used
+        full_mask = state.constraints.full_mask
+        eliminated = 0
+        for unit, cells in self.iter_units(state):
+            once = twice = 0
+            for index in cells:
+                mask = candidates[index]
+                twice |= once & mask
+                once |= mask
+            if full_mask & ~used[unit] & ~once:
+                raise Contradiction
+            singles = once & ~twice
+            if not singles:
+                continue
+            for index in cells:
+                mask = candidates[index] & singles
+                if not mask:
+                    continue
+                if mask & (mask - 1):
+                    raise Contradiction
+                eliminated += state.eliminate(index, ~mask)
+        return eliminated
+
+
+class NakedSubsets(Technique):
+    """
+    When `size` cells of a unit have only `size` digits between them,
+    the digits are removed from other cells of the unit.
+    """
+    size = None
+
+    def apply(self, state):
+        candidates = state.candidates
+        size = self.size
+        eliminated = 0
+        for unit, cells in self.iter_units(state):
+            if len(cells) <= size:
+                continue
+            small = [
+                index for index in cells
+                if count_bits(candidates[index]) <= size
+            ]
+            for subset in combinations(small, size):
+                mask = 0
+                for index in subset:
+                    mask |= candidates[index]
+                if count_bits(mask) != size:
+                    continue
+                for index in cells:
+                    if index not in subset:
+                        eliminated += state.eliminate(index, mask)
+        return eliminated
+
+
+class NakedPairs(NakedSubsets):
+    name = 'naked_pairs'
+    size = 2
+
+
+class NakedTriples(NakedSubsets):
+    name = 'naked_triples'
+    size = 3
+
+
+class HiddenSubsets(Technique):
+    """
+    When `size` digits of a unit fit the same `size` cells only, other
+    digits are removed from these cells.
+    """
+    houses = True
+    size = None
+
+    def apply(self, state):
+        size = self.size
+        eliminated = 0
+        for unit, cells in self.iter_units(state):
+            if len(cells) <= size:
+                continue
+            places = self.get_places(state, cells)
+            digits = [
+                digit for digit, digit_cells in places.items()
+                if len(digit_cells) <= size
+            ]
+            for subset in combinations(digits, size):
+                subset_cells = set()
+                for digit in subset:
+                    subset_cells.update(places[digit])
+                if len(subset_cells) != size:
+                    continue
+                mask = 0
+                for digit in subset:
+                    mask |= 1 << digit
+                for index in subset_cells:
+                    eliminated += state.eliminate(index, ~mask)
+        return eliminated
+
+
+class HiddenPairs(HiddenSubsets):
+    name = 'hidden_pairs'
+    size = 2
+
+
+class HiddenTriples(HiddenSubsets):
+    name = 'hidden_triples'
+    size = 3
+
+
+class LockedCandidates(Technique):
+    """
+    When every cell of a unit of `source_kinds` that fits a digit belongs
+    to another unit too, the digit is removed from the rest of that unit.
+    """
+    houses = True
+    source_kinds = ()
+
+    def apply(self, state):
+        constraints = state.constraints
+        unit_kinds = constraints.unit_kinds
+        cell_units = constraints.cell_units
+        unit_cells = constraints.unit_cells
+        eliminated = 0
+        for unit, cells in self.iter_units(state):
+            if unit_kinds[unit] not in self.source_kinds:
+                continue
+            for digit, digit_cells in self.get_places(state, cells).items():
+                if len(digit_cells) < 2:
+                    continue
+                shared = set(cell_units[digit_cells[0]])
+                for index in digit_cells[1:]:
+                    shared.intersection_update(cell_units[index])
+                shared.discard(unit)
+                for other in shared:
+                    for index in unit_cells[other]:
+                        if index not in digit_cells:
+                            eliminated += state.eliminate(index, 1 << digit)
+        return eliminated
+
+
+class PointingPairs(LockedCandidates):
+    """
+    A digit of a square locked to one row or column is removed from the
+    rest of the row or column.
+    """
+    name = 'pointing_pairs'
+    source_kinds = ('squares',)
+
+
+class BoxLineReduction(LockedCandidates):
+    """
+    A digit of a row or column locked to one square is removed from the
+    rest of the square.
+    """
+    name = 'box_line'
+    source_kinds = ('rows', 'columns')
+
+
+# Techniques by name, from the cheapest one.
+TECHNIQUES = {
+    technique.name: technique for technique in [
+        HiddenSingles,
+        NakedPairs,
+        PointingPairs,
+        BoxLineReduction,
+        HiddenPairs,
+        NakedTriples,
+        HiddenTriples,
+    ]
+}
+
+
+def get_techniques(names):
+    """
+    Returns techniques by `names` from `TECHNIQUES`, cheapest first.
+    """
+    return [
+        technique() for name, technique in TECHNIQUES.items()
+        if name in names
+    ]
+
+
+def technique_names(value):
+    """
+    Parses comma separated technique names, `all` stands for every one.
+    """
+    if value == 'all':
+        return list(TECHNIQUES)
+    names = [name for name in value.split(',') if name]
+    for name in names:
+        if name not in TECHNIQUES:
+            raise argparse.ArgumentTypeError(
+                'unknown technique {}, choose from {}'.format(
+                    name, ', '.join(TECHNIQUES)))
+    return names
@@ -0,0 +1,144 @@
+import time
+
+
+class Tracer(object):
+    """
+    Receives events of `BacktrackingSolver` search. Every method does
+    nothing, subclasses override the events they need.
+
+    The solver runs a separate traced search only when it has a tracer,
+    so the plain search pays nothing for the events.
+    """
+    def start(self, state):
+        """
+        Called when `solve` begins the search over `state`.
+        """
+
+    def propagate_start(self, state):
+        """
+        Called before propagation of a search node.
+        """
+
+    def propagate_end(self, state, consistent):
+        """
+        Called after propagation of a search node, `consistent` is False
+        if the node has no solutions.
+        """
+
+    def eliminated(self, state, technique, count):
+        """
+        Called when `technique` name removes `count` candidates.
+        """
+
+    def select_start(self, state):
+        """
+        Called before the solver chooses the cell and values to try.
+        """
+
+    def select_end(self, state, index):
+        """
+        Called after the solver chose the cell with `index`, None means
+        that the board is solved.
+        """
+
+    def guess(self, state, index, value, depth):
+        """
+        Called before `value` is tried in the cell with `index`, `depth`
+        is the number of guesses on the current search path.
+        """
+
+    def backtrack(self, state, index, value, depth):
+        """
+        Called after the search under a guess is over and undone.
+        """
+
+    def solution(self, state):
+        """
+        Called when the board of `state` is solved.
+        """
+
+
+class SolveStats(object):
+    """
+    Counters and per-phase times of a single solve, see `StatsTracer`.
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.passes = 0
+        self.guesses = 0
+        self.backtracks = 0
+        self.solutions = 0
+        self.max_depth = 0
+        self.eliminations = {}
+        self.times = {'propagation': 0.0, 'branching': 0.0}
+
+    def as_dict(self):
+        return {
+            'nodes': self.nodes,
+            'passes': self.passes,
+            'guesses': self.guesses,
+            'backtracks': self.backtracks,
+            'solutions': self.solutions,
+            'max_depth': self.max_depth,
+            'eliminations': dict(self.eliminations),
+            'times': dict(self.times),
+        }
+
+    def summary(self):
+        lines = [
+            'Search nodes: {}'.format(self.nodes),
+            'Propagation passes: {}'.format(self.passes),
+            'Guesses: {}'.format(self.guesses),
+            'Backtracks: {}'.format(self.backtracks),
+            'Solutions: {}'.format(self.solutions),
+            'Max depth: {}'.format(self.max_depth),
+        ]
+        for name, count in sorted(self.eliminations.items()):
+            lines.append('Eliminated by {}: {}'.format(name, count))
+        for phase, seconds in sorted(self.times.items()):
+            lines.append('Time in {}: {:.4f}s'.format(phase, seconds))
+        return '\n'.join(lines)
+
+
+class StatsTracer(Tracer):
+    """
+    Tracer, that collects `SolveStats` of the last solve into `stats`.
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.stats = SolveStats()
+        self.started = None
+
+    def start(self, state):
+        self.stats = SolveStats()
+
+    def propagate_start(self, state):
+        self.stats.nodes += 1
+        self.started = self.clock()
+
+    def propagate_end(self, state, consistent):
+        stats = self.stats
+        stats.times['propagation'] += self.clock() - self.started
+        stats.passes = state.passes
+
+    def eliminated(self, state, technique, count):
+        eliminations = self.stats.eliminations
+        eliminations[technique] = eliminations.get(technique, 0) + count
+
+    def select_start(self, state):
+        self.started = self.clock()
+
+    def select_end(self, state, index):
+        self.stats.times['branching'] += self.clock() - self.started
+
+    def guess(self, state, index, value, depth):
+        stats = self.stats
+        stats.guesses += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+
+    def backtrack(self, state, index, value, depth):
+        self.stats.backtracks += 1
+
+    def solution(self, state):
+        self.stats.solutions += 1
@@ -0,0 +1,219 @@
+"""
+NumPy engine, that propagates and validates many puzzles at once.
+
+Puzzles are rows of an `(N, size * size)` `uint8` array. Candidates of all
+cells of all puzzles are computed with array operations, naked and hidden
+singles are filled over the whole batch and only the puzzles left
+unsolved go to a regular solver one by one.
+
+NumPy is an optional dependency: `pip install sudoku[numpy]`.
+
+    python -m sudoku.vectorized data/problems.txt solutions.txt
+"""
+import argparse
+import sys
+import time
+import numpy
+from sudoku.board import Board, get_layout
+from sudoku.parsers import ParseError
+from sudoku.solvers import get_solver
+from sudoku.techniques import TECHNIQUES
+
+
+def load_lines(lines):
+    """
+    Loads puzzles given one per line, like `data/problems.txt`, into
+    `uint8` array with a row for every non-blank line.
+    """
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            rows.append(line.replace('.', '0').replace('_', '0')
+                        .replace('*', '0'))
+    if not rows:
+        return numpy.zeros((0, 81), dtype=numpy.uint8)
+    length = len(rows[0])
+    size = int(round(length ** 0.5))
+    if size * size != length or get_layout(size).square_size ** 2 != size:
+        raise ParseError('Unexpected puzzle length {}.'.format(length))
+    for number, row in enumerate(rows):
+        if len(row) != length:
+            raise ParseError('Line {} has {} cells, {} expected.'.format(
+                number + 1, len(row), length))
+    grids = numpy.frombuffer(''.join(rows).encode('ascii'),
+                             dtype=numpy.uint8).reshape(len(rows), length)
+    grids = grids - ord('0')
+    if (grids > size).any():
+        number, index = numpy.argwhere(grids > size)[0]
+        raise ParseError('Unexpected value on line {} position {}.'.format(
+            number + 1, index))
+    return grids
+
+
+class Units(object):
+    """
+    Unit index arrays of board `size`: `units` lists cells of every row,
+    column and square and `cell_units` lists units of every cell.
+    """
+    def __init__(self, size):
+        layout = get_layout(size)
+        self.size = size
+        self.full_mask = ((1 << size) - 1) << 1
+        self.units = numpy.array(
+            layout.rows + layout.columns + layout.squares, dtype=numpy.intp)
+        cell_units, _, _ = layout.get_unit_tables(layout.kinds)
+        self.cell_units = numpy.array(cell_units, dtype=numpy.intp)
+        self.digits = numpy.arange(1, size + 1, dtype=numpy.uint32)
+
+
+def get_units(grids):
+    return Units(int(round(grids.shape[1] ** 0.5)))
+
+
+def used_masks(grids, units):
+    """
+    Returns `(N, units)` array of digit bitmasks used by every unit.
+    """
+    bits = numpy.where(
+        grids > 0, numpy.left_shift(1, grids, dtype=numpy.uint32), 0)
+    return numpy.bitwise_or.reduce(bits[:, units.units], axis=2)
+
+
+def candidates(grids, units=None):
+    """
+    Returns `(N, cells)` array of candidates bitmasks, digit `d` is bit
+    `1 << d` like in `sudoku.rules.Constraints`. Filled cells get 0.
+    """
+    units = units or get_units(grids)
+    used = used_masks(grids, units)
+    cell_used = numpy.bitwise_or.reduce(used[:, units.cell_units], axis=2)
+    masks = numpy.uint32(units.full_mask) & ~cell_used
+    masks[grids > 0] = 0
+    return masks
+
+
+def conflicting(grids, units=None):
+    """
+    Returns boolean array, that tells which of `grids` have the same
+    digit twice in some unit.
+    """
+    units = units or get_units(grids)
+    unit_values = grids[:, units.units, None] == units.digits
+    return (unit_values.sum(axis=2) > 1).any(axis=(1, 2))
+
+
+def valid_grids(grids, units=None):
+    """
+    Returns boolean array, that tells which of completed `grids` are
+    solved correctly.
+    """
+    units = units or get_units(grids)
+    used = used_masks(grids, units)
+    return (grids > 0).all(axis=1) & (used == units.full_mask).all(axis=1)
+
+
+def propagate(grids, units=None):
+    """
+    Fills naked and hidden singles of all `grids` until nothing changes.
+    Returns `(grids, dead)`: new array of grids and boolean array of
+    grids, that turned out to have no solution.
+    """
+    units = units or get_units(grids)
+    grids = grids.copy()
+    dead = conflicting(grids, units)
+    active = numpy.nonzero(~dead)[0]
+    while len(active):
+        current = grids[active]
+        masks = candidates(current, units)
+        empty = current == 0
+        stuck = (empty & (masks == 0)).any(axis=1)
+
+        # Naked singles: cells with the only candidate left.
+        naked = empty & (masks != 0) & ((masks & (masks - 1)) == 0)
+        filled = current.copy()
+        rows, cells = numpy.nonzero(naked)
+        filled[rows, cells] = numpy.log2(masks[rows, cells]).astype(
+            numpy.uint8)
+
+        # Hidden singles: digits that fit the only cell of a unit.
+        planes = (masks[:, :, None] >> units.digits) & 1
+        unit_planes = planes[:, units.units, :]
+        counts = unit_planes.sum(axis=2)
+        used = used_masks(current, units)
+        missing = ((used[:, :, None] >> units.digits) & 1) == 0
+        stuck |= ((counts == 0) & missing).any(axis=(1, 2))
+        rows, unit, digit = numpy.nonzero(counts == 1)
+        position = unit_planes[rows, unit, :, digit].argmax(axis=1)
+        filled[rows, units.units[unit, position]] = digit + 1
+
+        changed = (filled != current).any(axis=1) & ~stuck
+        dead[active[stuck]] = True
+        grids[active[changed]] = filled[changed]
+        active = active[changed]
+    return grids, dead
+
+
+def solve_grids(grids, solver=None):
+    """
+    Solves every puzzle of `grids`. Singles are filled over the whole
+    batch first, puzzles left unsolved go to `solver` (backtracking
+    engine with every technique by default). Returns `(solutions,
+    solved)`: array of solutions and boolean array of solved puzzles.
+    """
+    units = get_units(grids)
+    solutions, dead = propagate(grids, units)
+    solved = ~dead & valid_grids(solutions, units)
+    rest = numpy.nonzero(~dead & ~solved & (solutions == 0).any(axis=1))[0]
+    if len(rest):
+        if solver is None:
+            solver = get_solver('backtracking', 'degree',
+                                techniques=TECHNIQUES)
+        for number in rest:
+            solution = next(solver.solve(Board(solutions[number])), None)
+            if solution is not None:
+                solutions[number] = numpy.frombuffer(solution.values,
+                                                     dtype=numpy.uint8)
+                solved[number] = True
+    return solutions, solved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Solve or validate many puzzles with NumPy')
+    parser.add_argument('infile', type=argparse.FileType('r'),
+                        help='Input file, one puzzle per line')
+    parser.add_argument('outfile', type=argparse.FileType('w'), nargs='?',
+                        help='Output file for solutions')
+    parser.add_argument('--validate', action='store_true',
+                        help='Check that every line is a solved grid')
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    try:
+        grids = load_lines(args.infile)
+    except ParseError as e:
+        parser.exit(1, '{}\n'.format(e))
+    if args.validate:
+        valid = valid_grids(grids)
+        for number in numpy.nonzero(~valid)[0]:
+            print('Line {} is not a valid solution.'.format(number + 1))
+        print('Valid {} of {} grids in {:.2f}s.'.format(
+            int(valid.sum()), len(grids), time.time() - started),
+            file=sys.stderr)
+        return 0 if valid.all() else 1
+
+    solutions, solved = solve_grids(grids)
+    if args.outfile:
+        for solution, is_solved in zip(solutions, solved):
+            if is_solved:
+                args.outfile.write(''.join(map(str, solution)))
+            args.outfile.write('\n')
+    print('Solved {} of {} puzzles in {:.2f}s.'.format(
+        int(solved.sum()), len(grids), time.time() - started),
+        file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,49 @@
-from unittest import TestCase
+from unittest import TestCase, skipUnless
+import asyncio
+import copy
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+try:
+    import numpy
+    from sudoku import vectorized
+except ImportError:
+    numpy = None
 from sudoku.board import Cell, Board
-from sudoku.parsers import TextParser, JSONParser, ParseError
+from sudoku.cache import (CachedSolver, SolutionCache, Transform,
+                          canonicalize)
+from sudoku.generator import (GRADES, generate, generate_many, get_random,
+                              grade, random_grid)
+from sudoku import __main__ as cli
+from sudoku.batch import (BATCH_FORMATS, BatchStats, solve_batch,
+                          verify_batch, format_line, format_json)
+from sudoku import parallel
+from sudoku.parallel import WorkerPool, solve_parallel
+from sudoku.service import SolverService, serve_tcp
+from sudoku.session import SolverSession
+from sudoku import profiling
+from sudoku.parsers import (TextParser, JSONParser, LineParser,
+                            BinaryParser, BoardArchive, ParseError, convert)
 from sudoku.rules import (RuleHandler, unique_in_row,
-                          unique_in_column, unique_in_square)
-from sudoku.solvers import BacktrackingSolver
+                          unique_in_column, unique_in_square, iter_bits,
+                          AllDifferent, AntiKing, AntiKnight, Cages, CageSum,
+                          Diagonals, Windows)
+from sudoku.solvers import (BacktrackingSolver, SearchState, DLXSolver,
+                            SolveTimeout, SolveCancelled, BudgetExceeded,
+                            Budget, CancelToken, count_solutions, is_unique)
+from sudoku.strategies import (FirstEmptySelector,
+                               MinimumRemainingValuesSelector,
+                               DegreeSelector, ValueOrder,
+                               LeastConstrainingValueOrder)
+from sudoku.techniques import (TECHNIQUES, Contradiction, HiddenSingles,
+                               NakedPairs, HiddenPairs, PointingPairs,
+                               BoxLineReduction, get_techniques)
+from sudoku.tracing import Tracer, StatsTracer
 
 
 class TestCell(TestCase):
@@ -60,6 +100,39 @@ class TestBoard(TestCase):
         assert 9 == len(squares)
         assert square00 == squares[0]
 
+    def test_cell_views(self):
+        cell = self.board.get_cell(1, 0)
+        assert (1, 0) == cell.coords
+        assert cell.is_empty
+        cell.value = 7
+        assert 7 == self.board.values[1]
+        assert 7 == self.board[1]
+        assert 2 == self.board[-1]
+
+    def test_copy(self):
+        board = self.board.copy()
+        board.get_cell(1, 0).value = 7
+        assert self.board.get_cell(1, 0).is_empty
+        assert self.matrix == copy.deepcopy(self.board).matrix
+
+    def test_compact_storage(self):
+        assert bytearray(self.matrix) == self.board.values
+        assert 9 == self.board.size
+        assert 3 == self.board.square_size
+        assert self.board.layout is Board(self.matrix).layout
+
+    def test_layout(self):
+        layout = self.board.layout
+        assert 20 == len(layout.peers[40])
+        assert 40 not in layout.peers[40]
+        assert (4, 4, 4) == (layout.cell_rows[40], layout.cell_columns[40],
+                             layout.cell_squares[40])
+        assert (0, 1, 2, 9, 10, 11, 18, 19, 20) == layout.squares[0]
+        cell_units, unit_cells, peers = layout.get_unit_tables(['rows'])
+        assert (1,) == cell_units[9]
+        assert layout.rows[1] == unit_cells[1]
+        assert 8 == len(peers[9])
+
     def get_square_by_cell(self):
         square00 = [9, 0, 0,
                     0, 0, 0,
@@ -122,9 +195,218 @@ class TestRulesHandler(TestCase):
         cell = self.board.get_cell(2, 3)
         assert not self.rules.is_valid(self.board, cell)
 
+    def test_rules_match_callables(self):
+        for cell in self.board:
+            expected = all(rule(self.board, cell)
+                           for rule in self.rules.default_rules)
+            assert expected == self.rules.is_valid(self.board, cell)
+
+    def test_fallback_rule(self):
+        def no_fours(board, cell):
+            return cell.value != 4
+        rules = RuleHandler([unique_in_row, no_fours])
+        assert rules.is_valid(self.board, self.board.get_cell(0, 0))
+        assert not rules.is_valid(self.board, self.board.get_cell(3, 0))
+
+
+class TestValidate(TestCase):
+    def setUp(self):
+        self.rules = RuleHandler()
+
+    def test_valid(self):
+        board = Board([
+            1, 2, 0, 0,
+            3, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 4,
+        ])
+        assert self.rules.validate(board) is None
+        conflict = self.rules.validate(board, complete=True)
+        assert 'empty' == conflict.rule
+        assert [(2, 0)] == conflict.positions
+        solution = Board([3, 4, 1, 2, 1, 2, 3, 4, 4, 3, 2, 1, 2, 1, 4, 3])
+        assert self.rules.validate(solution, complete=True) is None
+
+    def test_conflicts(self):
+        board = Board([
+            1, 2, 0, 4,
+            3, 4, 0, 0,
+            2, 1, 0, 4,
+            4, 3, 4, 3,
+        ])
+        conflict = self.rules.validate(board)
+        assert ('rows', 3, 4) == (conflict.rule, conflict.unit,
+                                  conflict.value)
+        assert [(0, 3), (2, 3)] == conflict.positions
+        assert 'Digit 4 repeats in row 3 at (0, 3) and (2, 3).' == str(
+            conflict)
+        conflict = RuleHandler([unique_in_column]).validate(board)
+        assert ('columns', 3) == (conflict.rule, conflict.unit)
+        assert [(3, 0), (3, 2)] == conflict.positions
+        conflict = RuleHandler([unique_in_square]).validate(board)
+        assert ('squares', 3) == (conflict.rule, conflict.unit)
+        board.values[0] = 5
+        assert 'range' == self.rules.validate(board).rule
+
+    def test_fallback_rule(self):
+        def no_fours(board, cell):
+            return cell.value != 4
+        board = Board([1, 2, 0, 4] + [0] * 12)
+        conflict = RuleHandler([unique_in_row, no_fours]).validate(board)
+        assert ('no_fours', [(3, 0)]) == (conflict.rule, conflict.positions)
+
+    def test_verify_batch(self):
+        lines = ['3412123443212143\n', '\n', '3412123443212134\n',
+                 '341212344321214\n']
+        results = list(verify_batch(lines))
+        assert [('3412123443212143', None)] == results[:1]
+        assert 'repeats in column 2' in results[1][1]
+        assert 'size' in results[2][1]
+
+
+class TestUnitRules(TestCase):
+    cages = [
+        (3, [(0, 0), (1, 0)]),
+        (7, [(2, 0), (3, 0)]),
+        (7, [(0, 1), (0, 2)]),
+        (4, [(1, 1), (2, 1)]),
+    ]
+
+    def setUp(self):
+        self.grids = [
+            bytes(solution.values) for solution in
+            BacktrackingSolver(RuleHandler()).solve(Board([0] * 16))
+        ]
+
+    def solve(self, rule, techniques=()):
+        rules = RuleHandler(RuleHandler.default_rules + [rule])
+        solver = BacktrackingSolver(rules, MinimumRemainingValuesSelector(),
+                                    techniques=get_techniques(techniques))
+        return sorted(bytes(solution.values)
+                      for solution in solver.solve(Board([0] * 16)))
+
+    def expected(self, units, totals=()):
+        """
+        Returns classic grids, that have different digits in every unit
+        of `units` indexes and add up to `totals`.
+        """
+        sums = list(zip(units, totals))
+        return sorted(
+            grid for grid in self.grids
+            if all(len({grid[i] for i in unit}) == len(unit)
+                   for unit in units)
+            and all(sum(grid[i] for i in unit) == total
+                    for unit, total in sums)
+        )
+
+    def test_units(self):
+        layout = Board([0] * 81).layout
+        assert [(0, 10, 20, 30, 40, 50, 60, 70, 80),
+                (8, 16, 24, 32, 40, 48, 56, 64, 72)] == (
+            Diagonals().get_units(layout))
+        windows = Windows().get_units(layout)
+        assert 4 == len(windows)
+        assert (10, 11, 12, 19, 20, 21, 28, 29, 30) == windows[0]
+        assert 4 * 7 * 8 == len(AntiKnight().get_units(layout))
+        tables = RuleHandler(
+            RuleHandler.default_rules + [AntiKnight()]).get_tables(layout)
+        assert 27 == len(tables.houses)
+        assert [21, 23, 29, 33, 47, 51, 57, 59] == sorted(
+            set(tables.peers[40]) - set(layout.peers[40]))
+        group = AllDifferent([[(0, 0), (9, 0)]])
+        self.assertRaises(ValueError, group.get_units, layout)
+
+    def test_variants(self):
+        diagonals = [(0, 5, 10, 15), (3, 6, 9, 12)]
+        assert self.expected(diagonals) == self.solve(Diagonals())
+        assert self.expected(diagonals) == self.solve(Diagonals(),
+                                                      TECHNIQUES)
+        windows = [(5, 6, 9, 10)]
+        assert self.expected(windows) == self.solve(Windows(), TECHNIQUES)
+        pairs = AntiKnight().get_units(Board([0] * 16).layout)
+        assert self.expected(pairs) == self.solve(AntiKnight())
+        assert [] == self.solve(AntiKing())
+
+    def test_cages(self):
+        assert [0b110] == CageSum(3, 2, 9).combinations
+        cage_sum = CageSum(10, 3, 9)
+        assert [1, 2, 3, 4, 5, 6, 7] == list(iter_bits(cage_sum.allowed(0)))
+        assert [2, 3, 4, 5, 6, 7] == list(iter_bits(
+            cage_sum.allowed(1 << 1)))
+        assert [6] == list(iter_bits(cage_sum.allowed(1 << 1 | 1 << 3)))
+        assert not cage_sum.fits(1 << 8)
+        units = [(0, 1), (2, 3), (4, 8), (5, 6)]
+        expected = self.expected(units, [3, 7, 7, 4])
+        assert 6 == len(expected)
+        assert expected == self.solve(Cages(self.cages), TECHNIQUES)
+
+    def test_validate(self):
+        rules = RuleHandler(RuleHandler.default_rules +
+                            [Diagonals(), Cages(self.cages)])
+        board = Board([1, 2, 3, 4] + [0] * 11 + [1])
+        conflict = rules.validate(board)
+        assert 'Digit 1 repeats in diagonal 0 at (0, 0) and (3, 3).' == str(
+            conflict)
+        assert not rules.constraints(board).consistent
+        board.values[15] = 0
+        board.values[8] = 2
+        conflict = rules.validate(board)
+        assert ('sums', 7, 2) == (conflict.rule, conflict.value,
+                                  conflict.unit)
+        assert "Digits of cage 2 at (0, 1) and (0, 2) can't add up to 7." == (
+            str(conflict))
+        assert not rules.constraints(board).consistent
+        assert not rules.is_valid(board, board.get_cell(0, 2))
+        board.values[8] = 3
+        assert rules.validate(board) is None
+        assert rules.constraints(board).consistent
+        assert rules.is_valid(board, board.get_cell(0, 2))
+        constraints = rules.constraints(board)
+        assert [4] == list(iter_bits(constraints.allowed(4)))
+
+
+class TestConstraints(TestCase):
+    def setUp(self):
+        self.matrix = [
+            1, 2, 0, 0,
+            3, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 4,
+        ]
+        self.board = Board(self.matrix)
+
+    def test_allowed(self):
+        constraints = RuleHandler().constraints(self.board)
+        assert [4] == list(iter_bits(constraints.allowed(5)))
+        assert [1, 2, 3] == list(iter_bits(constraints.allowed(14)))
+        assert constraints.is_allowed(2, 3)
+        assert not constraints.is_allowed(2, 1)
+
+    def test_set_and_clear(self):
+        constraints = RuleHandler().constraints(self.board)
+        constraints.set(2, 3)
+        assert not constraints.is_allowed(3, 3)
+        constraints.clear(2, 3)
+        assert constraints.is_allowed(3, 3)
+
+    def test_consistent(self):
+        assert RuleHandler().constraints(self.board).consistent
+        self.board.get_cell(3, 0).value = 1
+        assert not RuleHandler().constraints(self.board).consistent
+        rules = RuleHandler([unique_in_column])
+        assert rules.constraints(self.board).consistent
+
+    def test_fallback_rule(self):
+        def no_fours(board, cell):
+            return cell.value != 4
+        rules = RuleHandler([unique_in_row, no_fours])
+        constraints = rules.constraints(self.board)
+        assert [3] == list(iter_bits(constraints.allowed(2)))
+        assert self.board.get_cell(2, 0).is_empty
+
 
 def is_solved(board):
-    return all(not cell.is_empty for cell in board)
+    return RuleHandler().validate(board, complete=True) is None
 
 
 class TestBacktrackingSolver(TestCase):
@@ -233,6 +515,678 @@ class TestBacktrackingSolver(TestCase):
         assert is_solved(solution2)
         assert solution1.matrix != solution2.matrix
 
+    def test_solutions_are_independent(self):
+        matrix = self.make_matrix('''
+            3 _ _ 2
+            _ 2 3 _
+            _ 3 2 _
+            2 _ _ 3''')
+        self.init_solver(matrix)
+        solutions = list(self.solver.solve(self.puzzle))
+        assert 2 == len(solutions)
+        assert solutions[0].matrix != solutions[1].matrix
+        assert matrix == self.puzzle.matrix
+
+    def test_unsolvable(self):
+        matrix = self.make_matrix('''
+            1 2 _ _
+            _ _ 3 _
+            _ _ _ _
+            _ _ 4 _''')
+        self.init_solver(matrix)
+        assert [] == list(self.solver.solve(self.puzzle))
+
+    def test_solve_16x16(self):
+        matrix = [0] * 256
+        matrix[0] = matrix[255] = 1
+        self.init_solver(matrix)
+        solution = next(self.solver.solve(self.puzzle))
+        assert is_solved(solution)
+        assert all(self.rules.is_valid(solution, cell) for cell in solution)
+        assert 1 == solution.get_cell(15, 15)
+        assert self.puzzle.get_cell(1, 0).is_empty
+
+
+    def test_conflicting_clues(self):
+        matrix = [0] * 81
+        matrix[0] = matrix[8] = 5
+        self.init_solver(matrix)
+        assert [] == list(self.solver.solve(self.puzzle))
+
+
+    def test_timeout(self):
+        self.init_solver([0] * 81)
+        with self.assertRaises(SolveTimeout):
+            next(self.solver.solve(self.puzzle, timeout=-1))
+        with self.assertRaises(SolveTimeout):
+            next(DLXSolver().solve(self.puzzle, timeout=-1))
+
+
+class TestSearchState(TestCase):
+    def test_undo(self):
+        board = Board([
+            1, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 0,
+        ])
+        state = SearchState(board, RuleHandler().constraints(board))
+        candidates = list(state.candidates)
+        mark = state.mark()
+        state.assign(1, 2)
+        assert state.propagate()
+        assert 2 == board.get_cell(1, 0)
+        state.undo(mark)
+        assert board.get_cell(1, 0).is_empty
+        assert candidates == state.candidates
+        assert state.constraints.is_allowed(1, 2)
+
+    def test_trail_bounded_by_cells(self):
+        matrix = [0] * 256
+        matrix[0] = 1
+        board = Board(matrix)
+        state = SearchState(board, RuleHandler().constraints(board))
+        solver = BacktrackingSolver(RuleHandler())
+        search = solver.search(state)
+        next(search)
+        # Every cell is assigned at most once and its candidates could
+        # only shrink, so the trail can't outgrow cells * (size + 1).
+        assert state.nodes > 100
+        assert len(state.trail) <= 256 * 17
+
+
+class TestSearch(TestCase):
+    def test_checkpoint(self):
+        solver = BacktrackingSolver(RuleHandler())
+        expected = [b.values for b in solver.solve(Board([0] * 16))]
+        search = solver.start(Board([0] * 16))
+        found = [next(search.solutions()).values for _ in range(100)]
+        checkpoint = json.loads(json.dumps(search.checkpoint()))
+        nodes = solver.nodes
+        search = BacktrackingSolver(RuleHandler()).resume(checkpoint)
+        assert nodes == search.state.nodes
+        found.extend(board.values for board in search.solutions())
+        assert expected == found
+
+    def test_resume_after_timeout(self):
+        solver = BacktrackingSolver(RuleHandler())
+        search = solver.start(Board([0] * 81), timeout=0)
+        self.assertRaises(SolveTimeout, next, search)
+        search = solver.resume(search.checkpoint())
+        assert is_solved(next(search.solutions()))
+
+    def test_recursion_limit(self):
+        solver = BacktrackingSolver(RuleHandler(), FirstEmptySelector())
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            solution = next(solver.solve(Board([0] * 256)))
+        finally:
+            sys.setrecursionlimit(limit)
+        assert is_solved(solution)
+        assert solver.guesses > 100
+
+    def test_inconsistent(self):
+        matrix = [0] * 16
+        matrix[0] = matrix[1] = 1
+        search = BacktrackingSolver(RuleHandler()).start(Board(matrix))
+        assert [] == list(search)
+        assert not search.checkpoint()['descend']
+
+
+class TestBudget(TestCase):
+    solvers = [BacktrackingSolver(RuleHandler()), DLXSolver()]
+
+    def test_max_nodes(self):
+        for solver in self.solvers:
+            with self.assertRaises(BudgetExceeded) as context:
+                list(solver.solve(Board([0] * 16), budget=Budget(
+                    max_nodes=100)))
+            error = context.exception
+            assert ('nodes', 100) == (error.reason, error.nodes)
+            assert 0 < error.solutions < 288
+            assert error.guesses and error.elapsed >= 0
+
+    def test_max_solutions(self):
+        budget = Budget(max_solutions=5)
+        for solver in self.solvers:
+            assert 5 == len(list(solver.solve(Board([0] * 16),
+                                              budget=budget)))
+            assert [] == list(solver.solve(Board([0] * 16),
+                                           budget=Budget(max_solutions=0)))
+            assert 5 == count_solutions(Board([0] * 16), solver=solver,
+                                        budget=budget).count
+        search = self.solvers[0].start(Board([0] * 16), budget=budget)
+        assert 5 == len(list(search.solutions()))
+
+    def test_timeout(self):
+        for solver in self.solvers:
+            with self.assertRaises(BudgetExceeded) as context:
+                next(solver.solve(Board([0] * 81), 0))
+            assert isinstance(context.exception, SolveTimeout)
+            assert 'time' == context.exception.reason
+        self.assertRaises(ValueError, next, self.solvers[0].solve(
+            Board([0] * 16), 1, Budget()))
+
+    def test_cancel(self):
+        token = CancelToken()
+        budget = Budget(token=token)
+        for solver in self.solvers:
+            solutions = solver.solve(Board([0] * 256), budget=budget)
+            next(solutions)
+            timer = threading.Timer(0.01, token.cancel)
+            timer.start()
+            with self.assertRaises(SolveCancelled):
+                for _ in solutions:
+                    pass
+            timer.join()
+            token.cancelled = False
+
+    def test_batch(self):
+        solver = BacktrackingSolver(RuleHandler())
+        results = list(solve_batch(['.' * 16], solver,
+                                   budget=Budget(max_nodes=1)))
+        assert 'Node limit of 1 reached.' == results[0][2]
+
+
+class TestSession(TestCase):
+    matrix = [
+        3, 0, 0, 2,
+        4, 2, 3, 0,
+        0, 3, 2, 0,
+        2, 0, 0, 3,
+    ]
+
+    def setUp(self):
+        self.session = SolverSession(Board(self.matrix))
+
+    def test_moves(self):
+        session = self.session
+        session.set_cell(1, 0, 1)
+        assert [4] == session.candidates(2, 0)
+        assert [] == session.candidates(1, 0)
+        self.assertRaises(ValueError, session.set_cell, 0, 0, 4)
+        self.assertRaises(ValueError, session.set_cell, 2, 0, 1)
+        assert 1 == session.board.get_cell(1, 0).value
+        session.clear_cell(1, 0)
+        assert [1, 4] == session.candidates(2, 0)
+        assert session.undo()
+        assert 1 == session.board.get_cell(1, 0).value
+        assert session.undo()
+        assert not session.undo()
+        assert session.board.get_cell(1, 0).is_empty
+        assert session.redo() and session.redo() and not session.redo()
+        assert session.board.get_cell(1, 0).is_empty
+        assert self.matrix == session.board.matrix
+
+    def test_solvable(self):
+        session = self.session
+        assert session.is_solvable()
+        session.set_cell(1, 3, 1)
+        assert not session.is_solvable()
+        session.undo()
+        assert session.is_solvable()
+        assert not SolverSession(Board([0] * 16)).is_solved
+
+    def test_hints(self):
+        session = self.session
+        while not session.is_solved:
+            hint = session.hint()
+            assert 'naked_single' == hint.reason
+            session.set_cell(hint.x, hint.y, hint.value)
+        assert is_solved(session.board)
+        assert session.hint() is None
+
+    def test_technique_hints(self):
+        puzzle = LineParser().loads(
+            '4.....8.5.3..........7......2.....6.....8.4......1.......'
+            '6.3.7.5..2.....1.4......')
+        session = SolverSession(puzzle)
+        reasons = set()
+        while not session.is_solved:
+            hint = session.hint()
+            reasons.add(hint.reason)
+            session.set_cell(hint.x, hint.y, hint.value)
+        assert is_solved(session.board)
+        assert {'naked_single', 'hidden_singles'} <= reasons
+        empty = SolverSession(Board([0] * 16)).hint()
+        assert (0, 0, 'solution') == (empty.x, empty.y, empty.reason)
+
+
+class TestStrategies(TestCase):
+    matrix = [
+        3, 0, 0, 0,
+        0, 0, 0, 0,
+        0, 0, 0, 0,
+        0, 0, 0, 3,
+    ]
+
+    def solve(self, solver):
+        solutions = list(solver.solve(Board(self.matrix)))
+        assert all(is_solved(solution) for solution in solutions)
+        return sorted(list(solution.values) for solution in solutions)
+
+    def test_strategies_agree(self):
+        expected = self.solve(BacktrackingSolver(RuleHandler()))
+        assert len(expected) > 1
+        for select in [FirstEmptySelector(), MinimumRemainingValuesSelector(),
+                       DegreeSelector()]:
+            for order in [ValueOrder(), LeastConstrainingValueOrder()]:
+                solver = BacktrackingSolver(RuleHandler(), select, order)
+                assert expected == self.solve(solver)
+                assert solver.nodes > 0
+
+    def test_nodes_counted_per_solve(self):
+        solver = BacktrackingSolver(RuleHandler(),
+                                    MinimumRemainingValuesSelector())
+        self.solve(solver)
+        nodes = solver.nodes
+        self.solve(solver)
+        assert nodes == solver.nodes
+
+    def test_counters(self):
+        solver = BacktrackingSolver(RuleHandler())
+        self.solve(solver)
+        assert 0 < solver.guesses < solver.nodes <= solver.passes
+        solver = DLXSolver()
+        self.solve(solver)
+        assert 0 < solver.guesses < solver.nodes
+
+    def test_shared_selector(self):
+        select = DegreeSelector()
+        solver1 = BacktrackingSolver(RuleHandler(), select)
+        solver2 = BacktrackingSolver(RuleHandler(), select)
+        solutions = solver1.solve(Board(self.matrix))
+        next(solutions)
+        nodes = solver1.nodes
+        self.solve(solver2)
+        assert nodes == solver1.nodes
+
+    def test_select_cell(self):
+        board = Board([
+            1, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 2,
+        ])
+        state = SearchState(board, RuleHandler().constraints(board))
+        assert state.propagate()
+        assert 1 == FirstEmptySelector().select_cell(state)
+        assert 3 == MinimumRemainingValuesSelector().select_cell(state)
+        assert 3 == DegreeSelector().select_cell(state)
+
+    def test_lcv_order(self):
+        board = Board([
+            1, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 0,
+            0, 0, 0, 0,
+        ])
+        state = SearchState(board, RuleHandler().constraints(board))
+        assert state.propagate()
+        state.restrict(2, 1 << 2 | 1 << 3)
+        assert [4, 2, 3] == LeastConstrainingValueOrder().order_values(
+            state, 1)
+
+
+class TestTechniques(TestCase):
+    matrix = [
+        0, 0, 0,  0, 0, 0,  0, 0, 0,
+        0, 0, 0,  0, 0, 3,  0, 8, 5,
+        0, 0, 1,  0, 2, 0,  0, 0, 0,
+        0, 0, 0,  5, 0, 7,  0, 0, 0,
+        0, 0, 4,  0, 0, 0,  1, 0, 0,
+        0, 9, 0,  0, 0, 0,  0, 0, 0,
+        5, 0, 0,  0, 0, 0,  0, 7, 3,
+        0, 0, 2,  0, 1, 0,  0, 0, 0,
+        0, 0, 0,  0, 4, 0,  0, 0, 9,
+    ]
+
+    def setUp(self):
+        board = Board([0] * 81)
+        self.state = SearchState(board, RuleHandler().constraints(board))
+        self.full_mask = self.state.constraints.full_mask
+        assert self.state.propagate()
+
+    def remove(self, cells, *digits):
+        for index in cells:
+            for digit in digits:
+                self.state.eliminate(index, 1 << digit)
+
+    def test_hidden_singles(self):
+        self.remove(range(9), 5)
+        self.state.restrict(3, self.full_mask)
+        assert 8 == HiddenSingles().apply(self.state)
+        assert 1 << 5 == self.state.candidates[3]
+
+    def test_hidden_singles_contradiction(self):
+        self.remove(range(9), 5)
+        with self.assertRaises(Contradiction):
+            HiddenSingles().apply(self.state)
+        assert not self.state.propagate([HiddenSingles()])
+
+    def test_naked_pairs(self):
+        for index in [0, 1]:
+            self.state.restrict(index, 1 << 1 | 1 << 2)
+        assert 26 == NakedPairs().apply(self.state)
+        assert self.full_mask & ~(1 << 1 | 1 << 2) == self.state.candidates[2]
+        assert self.full_mask == self.state.candidates[27]
+
+    def test_hidden_pairs(self):
+        self.remove(range(2, 9), 1, 2)
+        assert 14 == HiddenPairs().apply(self.state)
+        assert 1 << 1 | 1 << 2 == self.state.candidates[0]
+
+    def test_pointing_pairs(self):
+        self.remove([9, 10, 11, 18, 19, 20], 7)
+        assert 6 == PointingPairs().apply(self.state)
+        assert not self.state.candidates[3] & 1 << 7
+        assert 0 == BoxLineReduction().apply(self.state)
+
+    def test_box_line_reduction(self):
+        self.remove(range(3, 9), 7)
+        assert 6 == BoxLineReduction().apply(self.state)
+        assert not self.state.candidates[9] & 1 << 7
+
+    def test_techniques_solve(self):
+        expected = next(DLXSolver().solve(Board(self.matrix))).values
+        solver = BacktrackingSolver(RuleHandler(), DegreeSelector())
+        assert expected == next(solver.solve(Board(self.matrix))).values
+        nodes = solver.nodes
+        for name in TECHNIQUES:
+            solver = BacktrackingSolver(RuleHandler(), DegreeSelector(),
+                                        techniques=get_techniques([name]))
+            assert expected == next(solver.solve(Board(self.matrix))).values
+        solver = BacktrackingSolver(RuleHandler(), DegreeSelector(),
+                                    techniques=get_techniques(TECHNIQUES))
+        assert expected == next(solver.solve(Board(self.matrix))).values
+        assert solver.nodes < nodes
+        assert solver.eliminations['hidden_singles'] > 0
+        eliminations = dict(solver.eliminations)
+        next(solver.solve(Board(self.matrix)))
+        assert eliminations == solver.eliminations
+
+
+class TestTracing(TestCase):
+    matrix = TestStrategies.matrix
+
+    def test_stats(self):
+        tracer = StatsTracer()
+        solver = BacktrackingSolver(RuleHandler(), tracer=tracer)
+        solutions = list(solver.solve(Board(self.matrix)))
+        plain = list(BacktrackingSolver(RuleHandler()).solve(
+            Board(self.matrix)))
+        assert [s.values for s in plain] == [s.values for s in solutions]
+        stats = tracer.stats
+        assert len(solutions) == stats.solutions
+        assert solver.nodes == stats.nodes
+        assert solver.guesses == stats.guesses == stats.backtracks
+        assert solver.passes == stats.passes
+        assert 0 < stats.max_depth < 16
+        assert stats.times['propagation'] > 0
+        assert stats.as_dict()['nodes'] == stats.nodes
+        assert 'Max depth: {}'.format(stats.max_depth) in stats.summary()
+
+        next(solver.solve(Board(self.matrix)))
+        assert 1 == tracer.stats.solutions
+
+    def test_events(self):
+        events = []
+
+        class EventTracer(Tracer):
+            def eliminated(self, state, technique, count):
+                events.append(('eliminated', technique))
+
+            def guess(self, state, index, value, depth):
+                events.append(('guess', depth))
+
+            def solution(self, state):
+                events.append(('solution',))
+
+        board = Board(TestTechniques.matrix)
+        solver = BacktrackingSolver(RuleHandler(), DegreeSelector(),
+                                    techniques=[HiddenSingles()],
+                                    tracer=EventTracer())
+        next(solver.solve(board))
+        assert ('solution',) == events[-1]
+        assert ('eliminated', 'hidden_singles') in events
+        assert solver.eliminations['hidden_singles'] > 0
+
+        del events[:]
+        next(solver.solve(Board(self.matrix)))
+        assert ('guess', 1) == next(e for e in events if e[0] == 'guess')
+        assert ('solution',) == events[-1]
+
+
+class TestCache(TestCase):
+    matrix = TestTechniques.matrix
+
+    def setUp(self):
+        self.puzzle = Board(self.matrix)
+        self.transform = Transform(
+            9, True, [5, 3, 4, 2, 0, 1, 8, 6, 7], [0, 2, 1, 6, 7, 8, 3, 5, 4],
+            [0, 4, 7, 1, 9, 2, 3, 8, 5, 6])
+        self.other = Board(self.transform.apply(self.puzzle.values))
+
+    def test_transform(self):
+        assert self.matrix != list(self.other.values)
+        assert self.puzzle.values == self.transform.invert(self.other.values)
+
+    def test_canonicalize(self):
+        key, transform = canonicalize(self.puzzle)
+        assert key == canonicalize(self.other)[0]
+        assert key == transform.apply(self.puzzle.values)
+
+    def test_cached_solver(self):
+        solver = CachedSolver(DLXSolver())
+        solution = next(solver.solve(self.puzzle))
+        assert (0, 1) == (solver.cache.hits, solver.cache.misses)
+        other_solution = next(solver.solve(self.other))
+        assert (1, 1) == (solver.cache.hits, solver.cache.misses)
+        assert self.transform.apply(solution.values) == other_solution.values
+
+        unsolvable = [0] * 16
+        unsolvable[0] = unsolvable[1] = 1
+        assert [] == list(solver.solve(Board(unsolvable)))
+        assert [] == list(solver.solve(Board(unsolvable)))
+        assert (2, 2) == (solver.cache.hits, solver.cache.misses)
+
+    def test_lru(self):
+        cache = SolutionCache(maxsize=1)
+        solver = CachedSolver(DLXSolver(), cache)
+        next(solver.solve(self.puzzle))
+        next(solver.solve(Board([0] * 16)))
+        assert 1 == len(cache)
+        assert (False, None) == cache.lookup(self.puzzle)
+
+    def test_save_and_load(self):
+        cache = SolutionCache()
+        next(CachedSolver(DLXSolver(), cache).solve(self.puzzle))
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, 'cache.json')
+            cache.save(path)
+            loaded = SolutionCache()
+            loaded.load(path)
+        found, solution = loaded.lookup(self.other)
+        assert found
+        assert is_solved(solution)
+        assert all(p.is_empty or p == s for p, s in zip(self.other, solution))
+
+
+class TestCountSolutions(TestCase):
+    def test_count(self):
+        for solver in [None, DLXSolver(),
+                       BacktrackingSolver(RuleHandler(), DegreeSelector())]:
+            result = count_solutions(Board([0] * 16), solver=solver)
+            assert 288 == result.count
+            assert not result.limit_reached
+            assert result.nodes > 0
+
+    def test_limit(self):
+        result = count_solutions(Board([0] * 81), 10)
+        assert 10 == result.count
+        assert result.limit_reached
+        assert 0 == count_solutions(Board([0] * 16), 0).count
+
+    def test_is_unique(self):
+        assert is_unique(Board(TestTechniques.matrix))
+        assert not is_unique(Board(TestStrategies.matrix))
+        matrix = [0] * 16
+        matrix[0] = matrix[1] = 1
+        assert not is_unique(Board(matrix))
+        assert 0 == count_solutions(Board(matrix)).count
+
+    def test_timeout(self):
+        with self.assertRaises(SolveTimeout):
+            count_solutions(Board([0] * 81), timeout=0)
+
+
+class TestGenerator(TestCase):
+    def test_random_grid(self):
+        rules = RuleHandler()
+        for size in [4, 9]:
+            grid = random_grid(size, get_random(1))
+            assert is_solved(grid)
+            assert all(rules.is_valid(grid, cell) for cell in grid)
+        assert (random_grid(9, get_random(1)).values !=
+                random_grid(9, get_random(2)).values)
+
+    def test_generate(self):
+        generated = generate(9, get_random(1))
+        puzzle = generated.puzzle
+        assert is_unique(puzzle)
+        assert generated.clues < 40
+        assert all(p.is_empty or p == s
+                   for p, s in zip(puzzle, generated.solution))
+        assert generated.grade in GRADES
+        assert generated.grade == grade(puzzle)
+
+    def test_symmetric(self):
+        puzzle = generate(9, get_random(1), symmetric=True).puzzle
+        values = puzzle.values
+        assert all(bool(values[i]) == bool(values[80 - i])
+                   for i in range(81))
+
+    def test_min_clues(self):
+        assert 50 == generate(9, get_random(1), min_clues=50).clues
+
+    def test_grade(self):
+        matrix = list(random_grid(9, get_random(1)).values)
+        matrix[0] = 0
+        assert 'easy' == grade(Board(matrix))
+        assert 'medium' == grade(Board(TestTechniques.matrix))
+
+    def test_seed(self):
+        first = [g.puzzle.values for g in generate_many(3, 4, seed=5)]
+        second = [g.puzzle.values for g in generate_many(3, 4, seed=5)]
+        assert first == second
+        assert first[:2] == [g.puzzle.values
+                             for g in generate_many(2, 4, seed=5)]
+
+    def test_parallel(self):
+        expected = [g.puzzle.values for g in generate_many(4, 4, seed=5)]
+        assert expected == [g.puzzle.values
+                            for g in generate_many(4, 4, seed=5, workers=2)]
+
+
+@skipUnless(numpy, 'needs numpy')
+class TestVectorized(TestCase):
+    lines = [
+        '53..7....6..195....98....6.8...6...34..8.3..17...2...6'
+        '.6....28....419..5....8..79',
+        '4.....8.5.3..........7......2.....6.....8.4......1......'
+        '.6.3.7.5..2.....1.4......',
+    ]
+
+    def test_load_lines(self):
+        grids = vectorized.load_lines(self.lines + [''])
+        assert (2, 81) == grids.shape
+        assert [5, 3, 0, 0, 7] == list(grids[0][:5])
+        with self.assertRaises(ParseError):
+            vectorized.load_lines(['1234', '12'])
+        with self.assertRaises(ParseError):
+            vectorized.load_lines(['1235'])
+
+    def test_candidates(self):
+        grids = vectorized.load_lines(self.lines)
+        masks = vectorized.candidates(grids)
+        for grid, grid_masks in zip(grids, masks):
+            board = Board(grid)
+            constraints = RuleHandler().constraints(board)
+            assert [
+                0 if value else constraints.allowed(index)
+                for index, value in enumerate(board.values)
+            ] == list(grid_masks)
+
+    def test_propagate(self):
+        grids = vectorized.load_lines(self.lines + ['11' + '.' * 79])
+        propagated, dead = vectorized.propagate(grids)
+        assert [False, False, True] == list(dead)
+        assert (propagated[0] > 0).all()
+        assert (propagated[1] == 0).any()
+        assert (grids[1] == vectorized.load_lines(self.lines[1:])[0]).all()
+
+    def test_valid_grids(self):
+        grids = vectorized.load_lines(self.lines)
+        solutions, solved = vectorized.solve_grids(grids)
+        assert solved.all()
+        for grid, solution in zip(grids, solutions):
+            expected = next(DLXSolver().solve(Board(grid)))
+            assert list(expected.values) == list(solution)
+        assert vectorized.valid_grids(solutions).all()
+        solutions[0][[0, 1]] = solutions[0][[1, 0]]
+        assert [False, True] == list(vectorized.valid_grids(solutions))
+        assert not vectorized.valid_grids(grids).any()
+
+
+class TestDLXSolver(TestCase):
+    def test_solve(self):
+        matrix = [
+            0, 0, 0,  0, 0, 0,  0, 0, 0,
+            0, 0, 0,  0, 0, 3,  0, 8, 5,
+            0, 0, 1,  0, 2, 0,  0, 0, 0,
+            0, 0, 0,  5, 0, 7,  0, 0, 0,
+            0, 0, 4,  0, 0, 0,  1, 0, 0,
+            0, 9, 0,  0, 0, 0,  0, 0, 0,
+            5, 0, 0,  0, 0, 0,  0, 7, 3,
+            0, 0, 2,  0, 1, 0,  0, 0, 0,
+            0, 0, 0,  0, 4, 0,  0, 0, 9,
+        ]
+        puzzle = Board(matrix)
+        solutions = list(DLXSolver().solve(puzzle))
+        assert 1 == len(solutions)
+        solution = solutions[0]
+        rules = RuleHandler()
+        assert is_solved(solution)
+        assert all(rules.is_valid(solution, cell) for cell in solution)
+        assert all(p.is_empty or p == s for p, s in zip(puzzle, solution))
+        assert matrix == puzzle.matrix
+
+    def test_count_all_4x4(self):
+        solver = DLXSolver()
+        assert 288 == len(list(solver.solve(Board([0] * 16))))
+        assert solver.nodes > 288
+
+    def test_conflicting_clues(self):
+        matrix = [0] * 16
+        matrix[0] = matrix[1] = 1
+        assert [] == list(DLXSolver().solve(Board(matrix)))
+
+    def test_interleaved_solves(self):
+        solver = DLXSolver()
+        solutions4 = solver.solve(Board([0] * 16))
+        next(solutions4)
+        solutions9 = solver.solve(Board([0] * 81))
+        assert is_solved(next(solutions9))
+        assert is_solved(next(solutions4))
+        assert 286 == len(list(solutions4))
+
+    def test_solve_16x16(self):
+        solution = next(DLXSolver().solve(Board([0] * 256)))
+        rules = RuleHandler()
+        assert is_solved(solution)
+        assert all(rules.is_valid(solution, cell) for cell in solution)
+
 
 class TestTextParser(TestCase):
     def setUp(self):
@@ -287,6 +1241,98 @@ class TestTextParser(TestCase):
         assert matrix_string == dump
 
 
+class TestLineParser(TestCase):
+    def setUp(self):
+        self.parser = LineParser()
+
+    def test_loads(self):
+        expected = [
+            3, 1, 4, 2,
+            4, 0, 0, 1,
+            1, 0, 2, 4,
+            2, 4, 0, 3,
+        ]
+        assert expected == self.parser.loads('31424_*11.242403\n').matrix
+        assert expected == self.parser.loads(b'31424_*11.242403').matrix
+
+    def test_loads_errors(self):
+        with self.assertRaisesRegex(ParseError, 'size'):
+            self.parser.loads('31424_*11.24240')
+        with self.assertRaisesRegex(ParseError, "'5' on position 15"):
+            self.parser.loads('31424_*11.242405')
+        with self.assertRaisesRegex(ParseError, "'x' on position 0"):
+            self.parser.loads('x1424_*11.242403')
+
+    def test_iter_file(self):
+        parser = LineParser('.')
+        with open('data/problems.txt') as f:
+            lines = [line.strip() for line in f if line.strip()]
+        for use_mmap in (False, True):
+            boards = list(parser.iter_file('data/problems.txt', use_mmap))
+            assert len(lines) == len(boards)
+            assert lines[-1] == parser.dumps(boards[-1])
+
+    def test_iter_lines_errors(self):
+        lines = [b'31424_*11.242403\n', b'\n', b'31424_*11.2424\n']
+        boards = self.parser.iter_lines(lines)
+        assert 16 == len(next(boards).values)
+        with self.assertRaisesRegex(ParseError, '^Line 3: '):
+            next(boards)
+
+
+class TestBinaryParser(TestCase):
+    def setUp(self):
+        self.parser = BinaryParser()
+
+    def test_dumps_loads(self):
+        board = Board([
+            3, 1, 4, 2,
+            4, 0, 0, 1,
+            1, 0, 2, 4,
+            2, 4, 0, 3,
+        ])
+        data = self.parser.dumps(board)
+        assert 12 + 8 == len(data)
+        assert board.values == self.parser.loads(data).values
+        board = Board(bytes(range(17)) * 15 + b'\x01')
+        data = self.parser.dumps(board)
+        assert 12 + 256 == len(data)
+        assert board.values == self.parser.loads(data).values
+
+    def test_streams(self):
+        boards = list(LineParser().iter_file('data/problems.txt'))
+        data = self.parser.dumps_many(boards)
+        assert 12 + 41 * len(boards) == len(data)
+        loaded = list(self.parser.iter_loads(data))
+        assert [b.values for b in boards] == [b.values for b in loaded]
+
+    def test_errors(self):
+        data = self.parser.dumps(Board([0] * 81))
+        self.assertRaises(ParseError, self.parser.loads, data[:11])
+        self.assertRaises(ParseError, self.parser.loads, b'X' + data[1:])
+        self.assertRaises(ParseError, self.parser.loads, data[:-1])
+        self.assertRaises(ParseError, self.parser.loads, data[:-1] + b'\xff')
+        self.assertRaises(ParseError, self.parser.loads,
+                          self.parser.dumps_many([]))
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'problems.sdkb')
+            assert 95 == convert('data/problems.txt', path)
+            boards = list(LineParser().iter_file('data/problems.txt'))
+            with BoardArchive(path) as archive:
+                assert 95 == len(archive)
+                assert boards[42].values == archive[42].values
+                assert boards[-1].values == archive[-1].values
+                assert ([b.values for b in boards[10:20]] ==
+                        [b.values for b in archive.iter_records(10, 20)])
+                self.assertRaises(IndexError, archive.__getitem__, 95)
+            lines = os.path.join(directory, 'problems.txt')
+            assert 95 == convert(path, lines)
+            with open(lines) as f, open('data/problems.txt') as original:
+                assert original.read().split() == f.read().split()
+
+
 class TestJSONParser(TestCase):
     def setUp(self):
         self.parser = JSONParser()
@@ -320,3 +1366,223 @@ class TestJSONParser(TestCase):
         board = Board(matrix)
         dump = self.parser.dumps(board)
         assert matrix_string == dump
+
+
+class TestBatch(TestCase):
+    lines = [
+        '3..2.23..32.2..3\n',
+        '\n',
+        '3..2.23..32.2..\n',
+        '11..............\n',
+    ]
+
+    def test_solve_batch(self):
+        stats = BatchStats()
+        solver = BacktrackingSolver(RuleHandler())
+        results = list(solve_batch(iter(self.lines), solver, stats))
+        assert 3 == len(results)
+        puzzle, solution, error = results[0]
+        assert '3..2.23..32.2..3' == puzzle
+        assert is_solved(solution)
+        assert error is None
+        assert results[1][1] is None and 'size' in results[1][2]
+        assert results[2][1] is None and results[2][2]
+        assert (1, 2, 3) == (stats.solved, stats.failed, stats.total)
+        assert stats.finished is not None
+
+    def test_timeout(self):
+        hard = ('4.....8.5.3..........7......2.....6.....8.4......1.......'
+                '6.3.7.5..2.....1.4......')
+        solver = BacktrackingSolver(RuleHandler())
+        results = list(solve_batch([hard, '.' * 16], solver, timeout=0.05))
+        assert results[0][1] is None
+        assert 'Timed out' in results[0][2]
+        assert is_solved(results[1][1])
+
+    def test_formats(self):
+        solution = Board([3, 4, 1, 2, 1, 2, 3, 4, 4, 3, 2, 1, 2, 1, 4, 3])
+        assert '3412123443212143' == format_line('', solution, None)
+        assert '' == format_line('', None, 'error')
+        record = json.loads(format_json('11', None, 'error'))
+        assert {'puzzle': '11', 'solution': None, 'error': 'error'} == record
+
+
+class TestMain(TestCase):
+    def run_main(self, argv, stdin=''):
+        streams = sys.stdin, sys.stdout, sys.stderr
+        sys.stdin = io.StringIO(stdin)
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        try:
+            code = cli.main(argv)
+        except SystemExit as e:
+            code = e.code
+        finally:
+            output = sys.stdout.getvalue()
+            sys.stdin, sys.stdout, sys.stderr = streams
+        return code, output
+
+    def test_solve(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outfile = os.path.join(directory, 'solution.json')
+            code, output = self.run_main(['data/input.txt', outfile])
+            with open(outfile) as f:
+                solution = JSONParser().loads(f.read())
+            assert (0, 'Puzzle solved.\n') == (code, output)
+            assert is_solved(solution)
+            unknown = os.path.join(directory, 'solution.csv')
+            code, _ = self.run_main(['data/input.txt', unknown])
+            assert 2 == code
+
+    def test_warm(self):
+        code, output = self.run_main(['warm', '--format', 'jsonl'],
+                                     '3..2.23..32.2..3\n\n11' + '.' * 14)
+        lines = [json.loads(line) for line in output.splitlines()]
+        assert 0 == code
+        assert '3142423113242413' == lines[0]['solution']
+        assert lines[1]['error']
+        code, _ = self.run_main(['warm', '--workers', '2'])
+        assert 2 == code
+
+    def test_lazy_imports(self):
+        script = (
+            'import sys\n'
+            'from sudoku.__main__ import main\n'
+            'main(["data/input.txt", sys.argv[1]])\n'
+            'print(" ".join(sorted(sys.modules)))\n'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.check_output([
+                sys.executable, '-c', script,
+                os.path.join(directory, 'solution.txt')
+            ], universal_newlines=True)
+        modules = output.splitlines()[-1].split()
+        for module in ['json', 'sudoku.batch', 'sudoku.cache',
+                       'sudoku.parallel', 'concurrent.futures']:
+            assert module not in modules
+        assert sorted(BATCH_FORMATS) == cli.BATCH_FORMAT_NAMES
+
+
+class TestProfiling(TestCase):
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            puzzles = os.path.join(directory, 'puzzles.txt')
+            with open(puzzles, 'w') as f:
+                f.write('3..2.23..32.2..3\n\n' + '.' * 16 + '\n')
+            report = os.path.join(directory, 'report.txt')
+            dump = os.path.join(directory, 'solve.pstats')
+            profiling.main([puzzles, '--techniques', 'all', '--slowest', '1',
+                            '--report', report, '--pstats', dump])
+            with open(report) as f:
+                text = f.read()
+            stats = profiling.pstats.Stats(dump)
+        assert text.startswith('Solved 2 of 2 puzzles')
+        for section in ['Slowest puzzles', 'Own time by module',
+                        'Hot functions by own time', 'Peak traced memory',
+                        'Top allocation sites']:
+            assert section in text
+        slowest = text.split('Slowest puzzles:\n')[1].split('\n\n')[0]
+        assert 2 == len(slowest.splitlines())
+        assert 'rules.py' in [
+            module for _, module in profiling.module_times(stats)]
+
+
+class TestService(TestCase):
+    hard = ('4.....8.5.3..........7......2.....6.....8.4......1.......'
+            '6.3.7.5..2.....1.4......')
+
+    def test_coalescing(self):
+        async def run():
+            async with SolverService(workers=2) as service:
+                puzzle = LineParser().loads('3..2.23..32.2..3')
+                solutions = await asyncio.gather(
+                    *[service.solve(puzzle) for _ in range(5)])
+                other = await service.solve(Board([0] * 16))
+                return service, solutions, other
+        service, solutions, other = asyncio.run(run())
+        assert (2, 4) == (service.solves, service.coalesced)
+        assert is_solved(solutions[0]) and is_solved(other)
+        assert all(s.values == solutions[0].values for s in solutions)
+        assert {} == service.in_flight
+
+    def test_budgets(self):
+        async def run(service, timeout=None):
+            async with service:
+                return await service.solve(LineParser().loads(self.hard),
+                                           timeout)
+        with self.assertRaises(SolveTimeout):
+            asyncio.run(run(SolverService(workers=1), 0.01))
+        with self.assertRaises(BudgetExceeded) as context:
+            asyncio.run(run(SolverService(workers=1, max_nodes=10)))
+        assert ('nodes', 10) == (context.exception.reason,
+                                 context.exception.nodes)
+
+    def test_server(self):
+        async def run():
+            async with SolverService(workers=2) as service:
+                server = await serve_tcp(service, '127.0.0.1', 0)
+                port = server.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', port)
+                writer.write(b'{"id": 1, "puzzle": "3..2.23..32.2..3"}\n'
+                             b'{"id": 2, "puzzle": [[1, 1], [0, 0]]}\n'
+                             b'{"id": 3, "puzzle": [[1, 1, 0, 0],'
+                             b' [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]}'
+                             b'\n')
+                lines = [await reader.readline() for _ in range(3)]
+                writer.close()
+                server.close()
+                await server.wait_closed()
+                return lines
+        responses = sorted((json.loads(line) for line in asyncio.run(run())),
+                           key=lambda response: response['id'])
+        assert '3142423113242413' == responses[0]['solution']
+        assert 'size' in responses[1]['error']
+        assert 'No solution' in responses[2]['error']
+
+
+class TestParallel(TestCase):
+    def test_solve_parallel(self):
+        lines = ['3..2.23..32.2..3', '11..............'] * 5
+        stats = BatchStats()
+        results = list(solve_parallel(lines, workers=2, chunksize=3,
+                                      stats=stats))
+        assert lines == [puzzle for puzzle, _, _ in results]
+        assert all(is_solved(s) for _, s, _ in results[::2])
+        assert all(s is None and e for _, s, e in results[1::2])
+        assert (5, 5) == (stats.solved, stats.failed)
+
+    def test_unordered(self):
+        lines = ['3..2.23..32.2..3', '.' * 16, '1' + '.' * 15]
+        results = list(solve_parallel(lines, workers=2, chunksize=1,
+                                      ordered=False, engine='dlx'))
+        assert sorted(lines) == sorted(puzzle for puzzle, _, _ in results)
+        assert all(is_solved(s) for _, s, _ in results)
+
+    @skipUnless(multiprocessing.get_start_method() == 'fork',
+                'needs workers forked with patched solve_line')
+    def test_worker_crash(self):
+        lines = ['3..2.23..32.2..3', 'crash', '.' * 16, '1' + '.' * 15]
+        solve_line = parallel.solve_line
+
+        def crashing_solve_line(line):
+            if line == 'crash':
+                os._exit(1)
+            return solve_line(line)
+
+        parallel.solve_line = crashing_solve_line
+        try:
+            results = list(solve_parallel(lines, workers=2, chunksize=2))
+        finally:
+            parallel.solve_line = solve_line
+        assert lines == [puzzle for puzzle, _, _ in results]
+        assert (None, WorkerPool.crash_error) == results[1][1:]
+        assert all(is_solved(results[i][1]) for i in [0, 2, 3])
+
+    def test_timeout(self):
+        hard = ('4.....8.5.3..........7......2.....6.....8.4......1.......'
+                '6.3.7.5..2.....1.4......')
+        results = list(solve_parallel([hard, '.' * 16], workers=1,
+                                      chunksize=1, timeout=0.05))
+        assert results[0][1] is None
+        assert 'Timed out' in results[0][2]
+        assert is_solved(results[1][1])